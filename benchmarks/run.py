@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+"""Benchmark the build scripts on synthetic source trees and cache directories.
+
+    python benchmarks/run.py --sizes 1000,10000 --output results.json
+    python benchmarks/run.py --baseline results.json
+
+Every timing is the best of `--repeat` runs, in seconds. With `--baseline`, timings slower than the baseline by
+more than `--threshold` are reported and the exit code is 1.
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from trees import LAYOUTS, generate_cache_dir, generate_license_inputs, generate_source_tree
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS_DIR = os.path.dirname(BENCHMARKS_DIR)
+BENCH_SCONSTRUCT = os.path.join(BENCHMARKS_DIR, "SConstruct")
+
+TREE_BENCHMARKS = ("configure", "glob", "null_build")
+SIZE_BENCHMARKS = ("cache", "strings")
+
+# Differences under this many seconds are noise, whatever the ratio.
+MIN_REGRESSION_SECONDS = 0.005
+
+
+def scons_command():
+    scons = shutil.which("scons")
+    return [scons] if scons else [sys.executable, "-m", "SCons"]
+
+
+def run_scons(tree, bench, repeat, extra_env=None):
+    """Run the benchmark project in `tree`, returning its own timings and the wall time of the run."""
+    fd, output = tempfile.mkstemp(suffix=".json")
+    os.close(fd)
+    env = dict(os.environ, BENCH_SCRIPTS_DIR=SCRIPTS_DIR, BENCH_OUTPUT=output, **(extra_env or {}))
+    # The cache would otherwise be used by every benchmark, and skew them.
+    env.pop("SCONS_CACHE", None)
+    command = scons_command() + ["-Q", "-C", tree, "-f", BENCH_SCONSTRUCT]
+    command += ["bench=" + bench, "bench_repeat={}".format(repeat), "progress=no", "compiledb=no"]
+    try:
+        start = time.perf_counter()
+        process = subprocess.run(command, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        wall = time.perf_counter() - start
+        if process.returncode != 0:
+            sys.exit("Benchmark '{}' failed in '{}':\n{}".format(bench, tree, process.stdout))
+        with open(output, "r", encoding="utf-8") as file:
+            return json.load(file), wall
+    finally:
+        os.remove(output)
+
+
+def bench_tree(tree, bench, repeat):
+    if bench == "configure":
+        runs = [run_scons(tree, "configure", 1) for _ in range(repeat)]
+        return {"in_process": min(r[0]["configure"] for r in runs), "wall": min(r[1] for r in runs)}
+
+    if bench == "glob":
+        try:
+            os.remove(os.path.join(tree, ".scons_glob_index"))
+        except FileNotFoundError:
+            pass
+        cold, _ = run_scons(tree, "glob", repeat)
+        warm, _ = run_scons(tree, "glob", repeat)
+        return {
+            "cold": cold["glob_first"],
+            "indexed": warm["glob_first"],
+            "repeated": warm["glob"],
+            "variant": warm["glob_variant"],
+        }
+
+    # Build everything once, the benchmark is the build that has nothing to do.
+    for name in (".sconsign.dblite", "build", "bin"):
+        path = os.path.join(tree, name)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        elif os.path.exists(path):
+            os.remove(path)
+    _, full = run_scons(tree, "build", 1)
+    runs = [run_scons(tree, "build", 1) for _ in range(repeat)]
+    return {"full": full, "wall": min(r[1] for r in runs), "configure": min(r[0]["configure"] for r in runs)}
+
+
+def bench_size(work_dir, size, bench, repeat):
+    if bench == "cache":
+        cache_dir = os.path.join(work_dir, "cache-{}".format(size))
+        generate_cache_dir(cache_dir, size)
+        # Half the entries have to go.
+        limit = size * 1024 / 2 / (1024 * 1024)
+        results, _ = run_scons(work_dir, "cache", repeat, {"BENCH_CACHE": cache_dir, "BENCH_CACHE_LIMIT": str(limit)})
+    else:
+        license_dir = os.path.join(work_dir, "license-{}".format(size))
+        copyright_path, license_path = generate_license_inputs(license_dir, size)
+        results, _ = run_scons(
+            license_dir, "strings", repeat, {"BENCH_COPYRIGHT": copyright_path, "BENCH_LICENSE": license_path}
+        )
+    # Measured by the configure benchmark.
+    results.pop("configure")
+    return results
+
+
+def flatten(prefix, values, out):
+    for key, value in values.items():
+        out[prefix + "/" + key] = round(value, 6)
+
+
+def run_benchmarks(args):
+    os.makedirs(args.work_dir, exist_ok=True)
+    work_dir = os.path.abspath(args.work_dir)
+    results = {}
+    for size in args.sizes:
+        for layout in args.layouts if any(bench in TREE_BENCHMARKS for bench in args.benchmarks) else ():
+            tree = os.path.join(work_dir, "{}-{}".format(layout, size))
+            print("Generating {} tree with {} sources...".format(layout, size), flush=True)
+            generate_source_tree(tree, size, layout)
+            for bench in args.benchmarks:
+                if bench in TREE_BENCHMARKS:
+                    print("  {}".format(bench), flush=True)
+                    flatten("{}/{}/{}".format(bench, layout, size), bench_tree(tree, bench, args.repeat), results)
+        for bench in args.benchmarks:
+            if bench in SIZE_BENCHMARKS:
+                print("Running {} with {} entries...".format(bench, size), flush=True)
+                flatten("{}/{}".format(bench, size), bench_size(work_dir, size, bench, args.repeat), results)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Print how `results` compare to `baseline`, returning the names of the regressions."""
+    regressions = []
+    for name in sorted(results):
+        current = results[name]
+        previous = baseline.get(name)
+        if previous is None:
+            print("{:<48} {:>10.4f}s  (new)".format(name, current))
+            continue
+        ratio = current / previous if previous > 0 else float("inf")
+        regressed = ratio > 1 + threshold and current - previous > MIN_REGRESSION_SECONDS
+        if regressed:
+            regressions.append(name)
+        print(
+            "{:<48} {:>10.4f}s  {:>10.4f}s  {:>+7.1%}{}".format(
+                name, current, previous, ratio - 1, "  REGRESSION" if regressed else ""
+            )
+        )
+    return regressions
+
+
+def host_info():
+    try:
+        import SCons
+
+        scons_version = SCons.__version__
+    except ImportError:
+        scons_version = None
+    return {
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "scons": scons_version,
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000", help="comma-separated source/cache entry counts (default: 1000)")
+    parser.add_argument("--layouts", default=",".join(LAYOUTS), help="comma-separated tree layouts")
+    parser.add_argument(
+        "--benchmarks",
+        default=",".join(TREE_BENCHMARKS + SIZE_BENCHMARKS),
+        help="comma-separated benchmarks to run (default: all)",
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="runs per timing, the best one is kept")
+    parser.add_argument("--work-dir", default=os.path.join(tempfile.gettempdir(), "openvic-scripts-bench"))
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare with the results stored in this JSON file")
+    parser.add_argument("--threshold", type=float, default=0.1, help="slowdown reported as a regression (0.1 = 10%%)")
+    args = parser.parse_args()
+
+    args.sizes = [int(size) for size in args.sizes.split(",")]
+    args.layouts = args.layouts.split(",")
+    args.benchmarks = args.benchmarks.split(",")
+    for layout in args.layouts:
+        if layout not in LAYOUTS:
+            parser.error("unknown layout '{}', use one of: {}".format(layout, ", ".join(LAYOUTS)))
+    for bench in args.benchmarks:
+        if bench not in TREE_BENCHMARKS + SIZE_BENCHMARKS:
+            parser.error("unknown benchmark '{}'".format(bench))
+
+    results = run_benchmarks(args)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump({"version": 1, "host": host_info(), "results": results}, file, indent=2, sort_keys=True)
+            file.write("\n")
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as file:
+            baseline = json.load(file)["results"]
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print("{} regressions over {:.0%}.".format(len(regressions), args.threshold))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
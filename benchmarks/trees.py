@@ -0,0 +1,112 @@
+import json
+import os
+import shutil
+
+TREE_MARKER_FILE = ".bench_tree"
+
+LAYOUTS = ("shallow", "deep")
+
+# Shallow trees put this many sources in each directory, one level below `src`.
+SHALLOW_FILES_PER_DIR = 100
+# Deep trees nest directories this many levels down, with this many subdirectories per level.
+DEEP_DEPTH = 6
+DEEP_BRANCHING = 4
+
+
+def _is_current(root, params):
+    """Return whether `root` already holds a tree generated with `params`, generating big trees is slow."""
+    try:
+        with open(os.path.join(root, TREE_MARKER_FILE), "r", encoding="utf-8") as file:
+            return json.load(file) == params
+    except (OSError, ValueError):
+        return False
+
+
+def _mark(root, params):
+    with open(os.path.join(root, TREE_MARKER_FILE), "w", encoding="utf-8") as file:
+        json.dump(params, file)
+
+
+def _source_dir(index, layout):
+    if layout == "shallow":
+        return "d{:04d}".format(index // SHALLOW_FILES_PER_DIR)
+    parts = []
+    for _ in range(DEEP_DEPTH):
+        parts.append("n{}".format(index % DEEP_BRANCHING))
+        index //= DEEP_BRANCHING
+    return os.path.join(*parts)
+
+
+def generate_source_tree(root, count, layout):
+    """Generate `count` C++ sources under `root/src`, with a header per directory and a common header."""
+    params = {"kind": "sources", "count": count, "layout": layout}
+    if _is_current(root, params):
+        return
+    shutil.rmtree(root, ignore_errors=True)
+    src = os.path.join(root, "src")
+    os.makedirs(src)
+    with open(os.path.join(src, "common.hpp"), "w", encoding="utf-8") as file:
+        file.write("#pragma once\n\nint common();\n")
+
+    headers = set()
+    for index in range(count):
+        directory = os.path.join(src, _source_dir(index, layout))
+        if directory not in headers:
+            os.makedirs(directory, exist_ok=True)
+            with open(os.path.join(directory, "dir.hpp"), "w", encoding="utf-8") as file:
+                file.write("#pragma once\n\n#include <common.hpp>\n")
+            headers.add(directory)
+        with open(os.path.join(directory, "f{:05d}.cpp".format(index)), "w", encoding="utf-8") as file:
+            file.write('#include "dir.hpp"\n\nint f{0}() {{ return common() + {0}; }}\n'.format(index))
+    _mark(root, params)
+
+
+def generate_cache_dir(path, count, entry_size=1024):
+    """Generate a SCons cache directory holding `count` entries with spread out access times."""
+    params = {"kind": "cache", "count": count, "entry_size": entry_size}
+    if _is_current(path, params):
+        return
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+    data = b"\0" * entry_size
+    for index in range(count):
+        key = "{:032x}".format(index * 2654435761 % (1 << 128))
+        subdir = os.path.join(path, key[:2].upper())
+        os.makedirs(subdir, exist_ok=True)
+        entry = os.path.join(subdir, key)
+        with open(entry, "wb") as file:
+            file.write(data)
+        # One access a minute, so eviction has to sort entries of every age.
+        timestamp = 1_700_000_000 + index * 60
+        os.utime(entry, (timestamp, timestamp))
+    _mark(path, params)
+
+
+def generate_license_inputs(path, count):
+    """Generate a COPYRIGHT file with `count // 10` components and a license text of about `count` KB.
+
+    Returns the paths of both files, in the order `license_builder` takes them.
+    """
+    os.makedirs(path, exist_ok=True)
+    copyright_path = os.path.join(path, "COPYRIGHT.txt")
+    license_path = os.path.join(path, "LICENSE.md")
+
+    paragraph = "Permission is hereby granted, free of charge, to any person obtaining a copy of this software.\n"
+    license_text = (paragraph * 10 + "\n") * count
+    with open(license_path, "w", encoding="utf-8") as file:
+        file.write(license_text)
+
+    lines = ["# Synthetic copyright file for benchmarks", ""]
+    for index in range(max(1, count // 10)):
+        lines += [
+            "Files: thirdparty/component{}/*".format(index),
+            "Comment: Component {}".format(index),
+            "Copyright: 2024, Author {}".format(index),
+            "License: Expat",
+            "",
+        ]
+    lines.append("License: Expat")
+    lines += [" " + paragraph.strip(), " .", " " + paragraph.strip()] * 10
+    with open(copyright_path, "w", encoding="utf-8") as file:
+        file.write("\n".join(lines) + "\n")
+    return copyright_path, license_path
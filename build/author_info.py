@@ -1,3 +1,6 @@
+from build.generated_file import write_generated_file
+
+
 def author_builder(target, source, env):
     name_prefix = env.get("name_prefix", "project")
     prefix_upper = name_prefix.upper()
@@ -11,10 +14,8 @@ def author_builder(target, source, env):
 
     reading = False
 
-    with open(str(target[0]), "wt", encoding="utf-8", newline="\n") as file:
-        file.write("/* THIS FILE IS GENERATED. EDITS WILL BE LOST. */\n\n")
-        file.write(
-            """\
+    lines = [
+        """\
 #pragma once
 
 #include <array>
@@ -22,27 +23,28 @@ def author_builder(target, source, env):
 
 namespace OpenVic {
 """
-        )
-
-        def close_section():
-            file.write("\t});\n")
-
-        for line in buffer.decode().splitlines():
-            if line.startswith("    ") and reading:
-                file.write(f'\t\t"{env.to_escaped_cstring(line).strip()}",\n')
-            elif line.startswith("## "):
-                if reading:
-                    close_section()
-                    file.write("\n")
-                    reading = False
-                section = sections.get(line[3:].strip(), None)
-                if section:
-                    file.write(
-                        f"\tstatic constexpr std::array {prefix_upper}_{section} = std::to_array<std::string_view>({{\n"
-                    )
-                    reading = True
-
-        if reading:
-            close_section()
-
-        file.write("}")
+    ]
+
+    def close_section():
+        lines.append("\t});\n")
+
+    for line in buffer.decode().splitlines():
+        if line.startswith("    ") and reading:
+            lines.append(f'\t\t"{env.to_escaped_cstring(line).strip()}",\n')
+        elif line.startswith("## "):
+            if reading:
+                close_section()
+                lines.append("\n")
+                reading = False
+            section = sections.get(line[3:].strip(), None)
+            if section:
+                lines.append(
+                    f"\tstatic constexpr std::array {prefix_upper}_{section} = std::to_array<std::string_view>({{\n"
+                )
+                reading = True
+
+    if reading:
+        close_section()
+
+    lines.append("}")
+    write_generated_file(str(target[0]), "".join(lines))
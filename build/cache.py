@@ -1,9 +1,453 @@
-# Copied from https://github.com/godotengine/godot/blob/c3b0a92c3cd9a219c1b1776b48c147f1d0602f07/methods.py#L1049-L1172
+import contextlib
+import functools
+import json
+import math
+import os
+import shutil
+import stat
+import threading
+import time
+from typing import Any, Dict
+
+import SCons.Action
+import SCons.CacheDir
+import SCons.Util
+from SCons.CacheDir import CacheDir
+
+from build.task_hooks import add_execute_hook
+
+CACHE_MANIFEST_FILE = ".scons_cache_manifest.json"
+# Costs are the measured build time in seconds since version 2, they were estimated from the size before.
+CACHE_MANIFEST_VERSION = 2
+# Suffix of the entries stored with each compression format.
+CACHE_COMPRESSIONS = {"none": "", "gzip": ".gz", "lz4": ".lz4", "zstd": ".zst"}
+
+_manifests: Dict[str, "CacheManifest"] = {}
+_shared_tier = None
+_compression = "none"
+# When the task of each target being built started, its build time is recorded as its cost when it's pushed.
+_build_starts: Dict[Any, float] = {}
+
+
+class CacheManifest:
+    """Persistent index of a SCons cache directory.
+
+    Maps each cache entry (relative to the cache root) to `[size, atime, cost]`, where `cost` is how long the entry
+    took to build in seconds, `None` when it wasn't measured. It is updated as entries are pushed and retrieved, so
+    builds never need to walk the cache.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.manifest_path = os.path.join(path, CACHE_MANIFEST_FILE)
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.removed = set()
+        self.loaded_mtime = None
+        self.dirty = False
+        if not self.load():
+            # No manifest yet, index what's already there once.
+            self.rescan()
+
+    def load(self):
+        try:
+            self.loaded_mtime = os.stat(self.manifest_path).st_mtime_ns
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            self.entries = manifest["entries"]
+            if manifest.get("version") != CACHE_MANIFEST_VERSION:
+                for entry in self.entries.values():
+                    entry[2] = None
+            return True
+        except (OSError, ValueError, KeyError):
+            return False
+
+    def rescan(self):
+        entries = {}
+        for subdir in os.scandir(self.path):
+            if not subdir.is_dir():
+                continue
+            for entry in os.scandir(subdir.path):
+                if entry.name.startswith(".") or not entry.is_file():
+                    continue
+                st = entry.stat()
+                key = subdir.name + "/" + entry.name
+                old = self.entries.get(key)
+                entries[key] = [st.st_size, st.st_atime, old[2] if old else None]
+        with self.lock:
+            self.entries = entries
+            self.dirty = True
+
+    def key(self, cachefile):
+        return os.path.relpath(cachefile, self.path).replace("\\", "/")
+
+    def record(self, cachefile, cost=None):
+        try:
+            size = os.path.getsize(cachefile)
+        except OSError:
+            return
+        key = self.key(cachefile)
+        with self.lock:
+            old = self.entries.get(key)
+            if cost is None:
+                cost = old[2] if old else None
+            self.entries[key] = [size, time.time(), cost]
+            self.removed.discard(key)
+            self.dirty = True
+
+    def total_size(self):
+        with self.lock:
+            return sum(e[0] for e in self.entries.values())
+
+    def evictions(self, limit, exponent_scale):
+        """Return the entries to delete to fit under `limit`, lowest weight first.
+
+        Entries are weighted by their build time per byte, times an exponential decay since they were last accessed.
+        The build time of entries that weren't measured is estimated from their size, at the average rate of the
+        measured ones.
+        """
+        current_time = time.time()
+        with self.lock:
+            total = sum(e[0] for e in self.entries.values())
+            if total <= limit:
+                return []
+            measured_size = sum(e[0] for e in self.entries.values() if e[2] is not None)
+            measured_cost = sum(e[2] for e in self.entries.values() if e[2] is not None)
+            rate = measured_cost / measured_size if measured_size and measured_cost else 1.0
+
+            def weight(entry):
+                size, atime, cost = entry
+                if cost is None:
+                    cost = size * rate
+                return cost / max(size, 1) * math.exp(-exponent_scale * (current_time - atime))
+
+            weighted = sorted(self.entries.items(), key=lambda x: weight(x[1]))
+        result = []
+        for key, (size, _atime, _cost) in weighted:
+            if total <= limit:
+                break
+            result.append(key)
+            total -= size
+        return result
+
+    def remove(self, keys):
+        removed = 0
+        for key in keys:
+            try:
+                os.remove(os.path.join(self.path, key))
+                removed += 1
+            except FileNotFoundError:
+                pass
+            except OSError:
+                continue
+            with self.lock:
+                self.entries.pop(key, None)
+                self.removed.add(key)
+                self.dirty = True
+        return removed
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            entries = dict(self.entries)
+            removed = set(self.removed)
+        # Merge what other builds sharing this cache recorded since we loaded the manifest.
+        try:
+            if os.stat(self.manifest_path).st_mtime_ns != self.loaded_mtime:
+                with open(self.manifest_path, "r", encoding="utf-8") as f:
+                    manifest = json.load(f)
+                for key, value in manifest["entries"].items():
+                    if key in removed:
+                        continue
+                    if manifest.get("version") != CACHE_MANIFEST_VERSION:
+                        value[2] = None
+                    if key not in entries or entries[key][1] < value[1]:
+                        entries[key] = value
+        except (OSError, ValueError, KeyError):
+            pass
+        tmp_path = "{}.{}.tmp".format(self.manifest_path, os.getpid())
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": CACHE_MANIFEST_VERSION, "entries": entries}, f, separators=(",", ":"))
+            os.replace(tmp_path, self.manifest_path)
+            self.loaded_mtime = os.stat(self.manifest_path).st_mtime_ns
+        except OSError:
+            return
+        with self.lock:
+            self.entries = entries
+            self.removed.clear()
+            self.dirty = False
+
+
+def get_cache_manifest(path):
+    path = os.path.abspath(path)
+    if path not in _manifests:
+        _manifests[path] = CacheManifest(path)
+    return _manifests[path]
+
+
+@functools.lru_cache(maxsize=None)
+def _opener(compression):
+    """Return the `open(path, mode)` function of `compression`, `None` if its module isn't installed."""
+    try:
+        if compression == "gzip":
+            import gzip
+
+            # Entries are written once and read many times, favor speed over ratio.
+            return functools.partial(gzip.open, compresslevel=1)
+        if compression == "lz4":
+            import lz4.frame
+
+            return lz4.frame.open
+        if compression == "zstd":
+            try:
+                from compression import zstd
+            except ImportError:
+                import zstandard as zstd
+            return zstd.open
+    except ImportError:
+        return None
+    return open
+
+
+def _entry_opener(cachefile):
+    for compression, suffix in CACHE_COMPRESSIONS.items():
+        if suffix and cachefile.endswith(suffix):
+            return _opener(compression)
+    return open
+
+
+class CacheStats:
+    """Counters of the cache retrievals and pushes of this build, across every environment's CacheDir."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.promoted = 0
+        self.retrieved_bytes = 0
+        self.pushed_bytes = 0
+
+    def add(self, **counts):
+        with self.lock:
+            for name, count in counts.items():
+                setattr(self, name, getattr(self, name) + count)
+
+
+cache_stats = CacheStats()
+
+
+class SharedCacheTier:
+    """Read-only cache directory consulted when an entry isn't in the local one, like a cache shared over NFS."""
+
+    def __init__(self, path):
+        self.path = path
+        self.prefix_len = SCons.CacheDir.CACHE_PREFIX_LEN
+        try:
+            with open(os.path.join(path, "config"), "r", encoding="utf-8") as f:
+                self.prefix_len = json.load(f)["prefix_len"]
+        except (OSError, ValueError, KeyError):
+            pass
+        # Entries may have been pushed with any compression, try the local one first.
+        self.suffixes = [CACHE_COMPRESSIONS[_compression]] + [
+            suffix
+            for compression, suffix in CACHE_COMPRESSIONS.items()
+            if compression != _compression and _opener(compression) is not None
+        ]
+
+    def find(self, sig):
+        cachedir = os.path.join(self.path, sig[: self.prefix_len].upper())
+        for suffix in self.suffixes:
+            cachefile = os.path.join(cachedir, sig + suffix)
+            if os.path.isfile(cachefile):
+                return cachefile
+        return None
+
+
+def setup_cache_tiers(shared_path=None, compression="none"):
+    """Consult `shared_path` when an entry isn't in the local cache, and store entries with `compression`.
+
+    Hits in the shared tier are promoted to the local one, which is the only one pushed to.
+    """
+    global _shared_tier, _compression
+
+    from SCons.Errors import UserError
+
+    if compression not in CACHE_COMPRESSIONS:
+        raise UserError(
+            "Unknown SCONS_CACHE_COMPRESSION '%s', use one of: %s" % (compression, ", ".join(CACHE_COMPRESSIONS))
+        )
+    if _opener(compression) is None:
+        print("Cache compression '" + compression + "' isn't installed, storing cache entries uncompressed.")
+        compression = "none"
+    elif compression != "none":
+        print("Cache compression enabled... (format: '" + compression + "')")
+    _compression = compression
+
+    if shared_path:
+        _shared_tier = SharedCacheTier(shared_path)
+        print("Shared cache enabled... (path: '" + shared_path + "')")
+
+    # Innermost, so waiting for a job slot isn't counted.
+    add_execute_hook(_time_build, priority=200)
+
+
+@contextlib.contextmanager
+def _time_build(task):
+    # Targets are pushed right after they're built, within the task.
+    start = time.perf_counter()
+    for target in task.targets:
+        _build_starts[target] = start
+    try:
+        yield
+    finally:
+        for target in task.targets:
+            _build_starts.pop(target, None)
+
+
+def _retrieve_shared(target, source, env):
+    t = target[0]
+    cachefile = _shared_tier.find(t.get_cachedir_bsig())
+    if cachefile is None:
+        return 1
+    if SCons.Action.execute_actions:
+        cd = env.get_CacheDir()
+        cd.copy_from_cache(env, cachefile, t.get_internal_path())
+        os.chmod(t.get_internal_path(), stat.S_IMODE(os.stat(cachefile).st_mode) | stat.S_IWRITE)
+        cache_stats.add(shared_hits=1, retrieved_bytes=os.path.getsize(cachefile))
+        if not cd.is_readonly():
+            # Later builds find it in the local tier.
+            cd.push(t)
+            cache_stats.add(promoted=1)
+    return 0
+
+
+def _retrieve_shared_string(target, source, env):
+    if _shared_tier.find(target[0].get_cachedir_bsig()) is not None:
+        return "Retrieved `%s' from shared cache" % target[0].get_internal_path()
+    return ""
+
+
+_RetrieveShared = SCons.Action.Action(_retrieve_shared, _retrieve_shared_string)
+_RetrieveSharedSilent = SCons.Action.Action(_retrieve_shared, None)
+
+
+class ManifestCacheDir(CacheDir):
+    """CacheDir that keeps the cache manifest up to date on every push and retrieval.
+
+    Entries are stored with the compression picked by `setup_cache_tiers`, and retrieved from its shared tier on a
+    local miss.
+    """
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.manifest = get_cache_manifest(path) if path is not None else None
+
+    def cachepath(self, node):
+        cachedir, cachefile = super().cachepath(node)
+        if cachefile is None:
+            return cachedir, cachefile
+        return cachedir, cachefile + CACHE_COMPRESSIONS[_compression]
+
+    @classmethod
+    def copy_from_cache(cls, env, src, dst):
+        opener = _entry_opener(src)
+        if opener is open:
+            return super().copy_from_cache(env, src, dst)
+        with opener(src, "rb") as fsrc, open(dst, "wb") as fdst:
+            shutil.copyfileobj(fsrc, fdst, 1024 * 1024)
+        if not env.cache_timestamp_newer:
+            shutil.copystat(src, dst)
+        return dst
+
+    @classmethod
+    def copy_to_cache(cls, env, src, dst):
+        opener = _entry_opener(dst)
+        if opener is open:
+            result = super().copy_to_cache(env, src, dst)
+        else:
+            with open(src, "rb") as fsrc, opener(dst, "wb") as fdst:
+                shutil.copyfileobj(fsrc, fdst, 1024 * 1024)
+            shutil.copystat(src, dst)
+            os.chmod(dst, stat.S_IMODE(os.stat(dst).st_mode) | stat.S_IWRITE)
+            result = dst
+        cache_stats.add(pushed_bytes=os.path.getsize(dst))
+        return result
+
+    def get_cachedir_csig(self, node):
+        cachefile = self.cachepath(node)[1]
+        opener = _entry_opener(cachefile or "")
+        if opener is open or not os.path.exists(cachefile):
+            return super().get_cachedir_csig(node)
+        # The signature of the content, not of the compressed entry.
+        with opener(cachefile, "rb") as f:
+            return SCons.Util.hash_signature(f.read())
+
+    def retrieve(self, node):
+        if not self.is_enabled():
+            return False
+        cache_stats.add(requests=1)
+        hit = super().retrieve(node)
+        if hit:
+            cachefile = self.cachepath(node)[1]
+            if self.manifest is not None:
+                self.manifest.record(cachefile)
+            if SCons.Action.execute_actions:
+                cache_stats.add(local_hits=1, retrieved_bytes=os.path.getsize(cachefile))
+            return True
+        if _shared_tier is None:
+            return False
+
+        env = node.get_build_env()
+        if SCons.CacheDir.cache_show:
+            if _RetrieveSharedSilent(node, [], env, execute=1) == 0:
+                node.build(presub=0, execute=0)
+                return True
+        elif _RetrieveShared(node, [], env, execute=1) == 0:
+            return True
+        return False
+
+    def push(self, node):
+        result = super().push(node)
+        if self.manifest is not None:
+            cachefile = self.cachepath(node)[1]
+            if cachefile is not None and os.path.exists(cachefile):
+                start = _build_starts.get(node)
+                self.manifest.record(cachefile, time.perf_counter() - start if start is not None else None)
+        return result
+
+
+def format_size(size_bytes):
+    if size_bytes == 0:
+        return "0 bytes"
+    size_name = ("bytes", "KB", "MB", "GB", "TB", "PB", "EB", "ZB", "YB")
+    i = int(math.floor(math.log(size_bytes, 1024)))
+    p = math.pow(1024, i)
+    s = round(size_bytes / p, 2)
+    return "%s %s" % (int(s) if i == 0 else s, size_name[i])
+
+
+def print_cache_stats():
+    stats = cache_stats
+    if stats.requests == 0 and stats.pushed_bytes == 0:
+        return
+    hits = stats.local_hits + stats.shared_hits
+    summary = "SCons cache: {} hits / {} requests ({:.1f}%)".format(
+        hits, stats.requests, 100.0 * hits / stats.requests if stats.requests else 0.0
+    )
+    if _shared_tier is not None:
+        summary += ", {} from the shared tier ({} promoted)".format(stats.shared_hits, stats.promoted)
+    summary += ", {} retrieved, {} pushed".format(format_size(stats.retrieved_bytes), format_size(stats.pushed_bytes))
+    print(summary)
+
+
+# Based on https://github.com/godotengine/godot/blob/c3b0a92c3cd9a219c1b1776b48c147f1d0602f07/methods.py#L1049-L1172
 def show_progress(env):
-    import os
+    import atexit
     import sys
-    import glob
-    from SCons.Script import Progress, Command, AlwaysBuild
+    from SCons.Script import Progress, Command, AlwaysBuild, Alias, COMMAND_LINE_TARGETS
 
     screen = sys.stdout
     # Progress reporting is not available in non-TTY environments since it
@@ -14,21 +458,24 @@ def show_progress(env):
     node_count_interval = 1
     node_count_fname = str(env.Dir("#")) + "/.scons_node_count"
 
-    import time, math
-
     class cache_progress:
         # The default is 1 GB cache and 12 hours half life
         def __init__(self, path=None, limit=1073741824, half_life=43200):
             self.path = path
             self.limit = limit
             self.exponent_scale = math.log(2) / half_life
+            self.manifest = get_cache_manifest(path) if path != None else None
+            self.pruner = None
             if env["verbose"] and path != None:
                 screen.write(
                     "Current cache limit is {} (used: {})\n".format(
-                        self.convert_size(limit), self.convert_size(self.get_size(path))
+                        self.convert_size(limit), self.convert_size(self.manifest.total_size())
                     )
                 )
-            self.delete(self.file_list())
+            if self.manifest is not None and self.manifest.total_size() > self.limit:
+                # Prune off the critical path, the build only touches the manifest.
+                self.pruner = threading.Thread(target=self.prune, daemon=True)
+                self.pruner.start()
 
         def __call__(self, node, *args, **kw):
             nonlocal node_count, node_count_max, node_count_interval, node_count_fname, show_progress
@@ -45,71 +492,55 @@ def show_progress(env):
                     screen.write("\r[Initial build] ")
                     screen.flush()
 
+        def prune(self):
+            self.delete(self.file_list())
+
         def delete(self, files):
             if len(files) == 0:
                 return
             if env["verbose"]:
                 # Utter something
                 screen.write("\rPurging %d %s from cache...\n" % (len(files), len(files) > 1 and "files" or "file"))
-            [os.remove(f) for f in files]
+            self.manifest.remove(files)
 
         def file_list(self):
-            if self.path is None:
-                # Nothing to do
-                return []
-            # Gather a list of (filename, (size, atime)) within the
-            # cache directory
-            file_stat = [(x, os.stat(x)[6:8]) for x in glob.glob(os.path.join(self.path, "*", "*"))]
-            if file_stat == []:
+            if self.manifest is None:
                 # Nothing to do
                 return []
-            # Weight the cache files by size (assumed to be roughly
-            # proportional to the recompilation time) times an exponential
-            # decay since the ctime, and return a list with the entries
-            # (filename, size, weight).
-            current_time = time.time()
-            file_stat = [(x[0], x[1][0], (current_time - x[1][1])) for x in file_stat]
-            # Sort by the most recently accessed files (most sensible to keep) first
-            file_stat.sort(key=lambda x: x[2])
-            # Search for the first entry where the storage limit is
-            # reached
-            sum, mark = 0, None
-            for i, x in enumerate(file_stat):
-                sum += x[1]
-                if sum > self.limit:
-                    mark = i
-                    break
-            if mark is None:
-                return []
-            else:
-                return [x[0] for x in file_stat[mark:]]
+            return self.manifest.evictions(self.limit, self.exponent_scale)
+
+        def finish(self):
+            print_cache_stats()
+            if self.manifest is None:
+                return
+            if self.pruner is not None:
+                self.pruner.join()
+            # What this build pushed over the limit is pruned in the background by the next one, don't hold up the
+            # end of the build for it.
+            self.manifest.save()
 
         def convert_size(self, size_bytes):
-            if size_bytes == 0:
-                return "0 bytes"
-            size_name = ("bytes", "KB", "MB", "GB", "TB", "PB", "EB", "ZB", "YB")
-            i = int(math.floor(math.log(size_bytes, 1024)))
-            p = math.pow(1024, i)
-            s = round(size_bytes / p, 2)
-            return "%s %s" % (int(s) if i == 0 else s, size_name[i])
-
-        def get_size(self, start_path="."):
-            total_size = 0
-            for dirpath, dirnames, filenames in os.walk(start_path):
-                for f in filenames:
-                    fp = os.path.join(dirpath, f)
-                    total_size += os.path.getsize(fp)
-            return total_size
+            return format_size(size_bytes)
 
     def progress_finish(target, source, env):
-        nonlocal node_count, progressor
+        nonlocal node_count
         try:
             with open(node_count_fname, "w") as f:
                 f.write("%d\n" % node_count)
-            progressor.delete(progressor.file_list())
         except Exception:
             pass
 
+    def cache_prune(target, source, env):
+        if progressor.manifest is None:
+            print("SCONS_CACHE is not set, nothing to prune.")
+            return
+        if progressor.pruner is not None:
+            progressor.pruner.join()
+        # Reconcile the manifest with entries written by tools that don't update it.
+        progressor.manifest.rescan()
+        progressor.prune()
+        progressor.manifest.save()
+
     try:
         with open(node_count_fname) as f:
             node_count_max = int(f.readline())
@@ -122,6 +553,12 @@ def show_progress(env):
     cache_limit = float(os.getenv("SCONS_CACHE_LIMIT", 1024)) * 1024 * 1024
     progressor = cache_progress(cache_directory, cache_limit)
     Progress(progressor, interval=node_count_interval)
+    atexit.register(progressor.finish)
 
     progress_finish_command = Command("progress_finish", [], progress_finish)
     AlwaysBuild(progress_finish_command)
+
+    if "cache-prune" in COMMAND_LINE_TARGETS:
+        cache_prune_command = Command("cache_prune", [], cache_prune)
+        AlwaysBuild(cache_prune_command)
+        Alias("cache-prune", cache_prune_command)
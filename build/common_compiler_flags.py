@@ -1,21 +1,8 @@
 # Based on https://github.com/godotengine/godot-cpp/blob/98ea2f60bb3846d6ae410d8936137d1b099cd50b/tools/common_compiler_flags.py
-import os
-import subprocess
-
-
-def using_clang(env):
-    return "clang" in os.path.basename(env["CC"])
-
-
-def is_vanilla_clang(env):
-    if not using_clang(env):
-        return False
-    try:
-        version = subprocess.check_output([env.subst(env["CXX"]), "--version"]).strip().decode("utf-8")
-    except (subprocess.CalledProcessError, OSError):
-        print("Couldn't parse CXX environment variable to infer compiler version.")
-        return False
-    return not version.startswith("Apple")
+from build.debug_info import setup_split_debug
+from build.lto import setup_lto_link
+from build.pgo import setup_pgo
+from build.toolchain import is_vanilla_clang, linker_supports, supports_flag, using_clang
 
 
 def exists(env):
@@ -103,6 +90,9 @@ def generate(env):
                 env.AppendUnique(CCFLAGS=["/GL"])
                 env.AppendUnique(ARFLAGS=["/LTCG"])
                 env.AppendUnique(LINKFLAGS=["/LTCG"])
+
+        if env["pgo"] != "none":
+            print("PGO is only supported with GCC and Clang, ignoring it.")
     else:
         if env["debug_symbols"]:
             # Adding dwarf-4 explicitly makes stacktraces work with clang builds,
@@ -112,6 +102,19 @@ def generate(env):
                 env.Append(CCFLAGS=["-g3"])
             else:
                 env.Append(CCFLAGS=["-g2"])
+
+            if env["split_debug"]:
+                if env["platform"] == "linux":
+                    setup_split_debug(env)
+                else:
+                    print("split_debug is only supported when targeting Linux, ignoring it.")
+
+            if env["compress_debug"]:
+                if supports_flag(env, "-gz") and linker_supports(env, "-gz"):
+                    env.Append(CCFLAGS=["-gz"])
+                    env.Append(LINKFLAGS=["-gz"])
+                else:
+                    print("The toolchain doesn't support compressed debug sections, ignoring compress_debug.")
         else:
             if using_clang(env) and not is_vanilla_clang(env) and not env["use_mingw"]:
                 # Apple Clang, its linker doesn't like -s.
@@ -143,3 +146,8 @@ def generate(env):
         elif env["lto"] == "full":
             env.Append(CCFLAGS=["-flto"])
             env.Append(LINKFLAGS=["-flto"])
+
+        if env["pgo"] != "none":
+            setup_pgo(env)
+
+    setup_lto_link(env)
@@ -0,0 +1,72 @@
+import json
+import os
+from typing import Any, Dict, Tuple
+
+from build.object_emitter import C_SUFFIXES, CXX_SUFFIXES, add_object_emitter
+
+# Translation units recorded by the object emitter, by source path. The first environment to build a source wins,
+# so sources built by several variants, or as both static and shared objects, only get one entry.
+_entries: Dict[str, Tuple[Any, Any, Any]] = {}
+
+
+def _compiledb_emitter(target, source, env):
+    if not env.get("compiledb", False):
+        return target, source
+    for s in source:
+        node = s if s.is_derived() else s.srcnode()
+        _entries.setdefault(node.abspath, (env, target[0], s))
+    return target, source
+
+
+def _command_variable(target, source):
+    prefix = "SH" if getattr(target.attributes, "shared", False) else ""
+    language = "CC" if os.path.splitext(str(source))[1] in C_SUFFIXES else "CXX"
+    return "$" + prefix + language + "COM"
+
+
+def _entry(directory, path, env, target, source):
+    """Return the database entry of one translation unit."""
+    from SCons.Platform import TempFileMunge
+
+    class NoTempFile(TempFileMunge):
+        # Tools need the full command line, not a response file.
+        def __call__(self, target, source, env, for_signature):
+            return self.cmd
+
+    overrides = env.Override({"TEMPFILE": NoTempFile, "COMPILER_LAUNCHER": ""})
+    command = overrides.subst(_command_variable(target, source), target=target, source=source)
+    return {"directory": directory, "command": command.strip(), "file": path, "output": target.abspath}
+
+
+def _write_compiledb(target, source, env):
+    directory = env.Dir("#").abspath
+    entries = [_entry(directory, path, *_entries[path]) for path in sorted(_entries)]
+    content = json.dumps(entries, indent=2) + "\n"
+
+    path = target[0].abspath
+    try:
+        with open(path, "rt", encoding="utf-8") as file:
+            if file.read() == content:
+                return
+    except (OSError, UnicodeDecodeError):
+        pass
+    # Editors watch this file, never let them see it half-written.
+    with open(path + ".tmp", "wt", encoding="utf-8", newline="\n") as file:
+        file.write(content)
+    os.replace(path + ".tmp", path)
+
+
+def setup_compiledb(env, path):
+    """Generate the compilation database at `path`, returning its node.
+
+    Entries come from the sources passed to the object builders, so building the returned node (the `compiledb`
+    alias) only needs the SConscripts to be read, not the objects to be built. The file is only rewritten when an
+    entry changed.
+    """
+    add_object_emitter(env, _compiledb_emitter, CXX_SUFFIXES + C_SUFFIXES)
+    database = env.Command(path, [], env.Run(_write_compiledb))
+    env.AlwaysBuild(database)
+    env.NoCache(database)
+    env.Precious(database)
+    env.Alias("compiledb", database)
+    return database
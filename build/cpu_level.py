@@ -0,0 +1,103 @@
+X86_64_LEVELS = ("x86-64-v1", "x86-64-v2", "x86-64-v3", "x86-64-v4")
+ARM64_LEVELS = (
+    "armv8-a",
+    "armv8.1-a",
+    "armv8.2-a",
+    "armv8.3-a",
+    "armv8.4-a",
+    "armv8.5-a",
+    "armv8.6-a",
+    "armv8.7-a",
+    "armv8.8-a",
+    "armv9-a",
+)
+LEVEL_ALIASES = {"v1": "x86-64-v1", "v2": "x86-64-v2", "v3": "x86-64-v3", "v4": "x86-64-v4", "x86-64": "x86-64-v1"}
+
+MSVC_X86_64_ARCH = {
+    "x86-64-v1": [],
+    "x86-64-v2": ["/arch:SSE4.2"],
+    "x86-64-v3": ["/arch:AVX2"],
+    "x86-64-v4": ["/arch:AVX512"],
+}
+
+
+def parse_cpu_levels(env):
+    """Return the levels listed in `cpu_level`, validated against the target architecture."""
+    levels = [LEVEL_ALIASES.get(level.strip(), level.strip()) for level in env["cpu_level"].split(",") if level.strip()]
+    allowed = {"x86_64": X86_64_LEVELS, "arm64": ARM64_LEVELS}.get(env["arch"], ())
+    for level in levels:
+        if level not in allowed:
+            if not allowed:
+                print("cpu_level is only supported on x86_64 and arm64, not " + env["arch"] + ".")
+            else:
+                print(
+                    "Unsupported cpu_level '{}' for {}, use one of: {}".format(level, env["arch"], ", ".join(allowed))
+                )
+            env.Exit(255)
+    return levels
+
+
+def cpu_level_flags(env, level):
+    """Return `(ccflags, linkflags)` targeting `level`."""
+    if level is None:
+        return [], []
+    if env.get("is_msvc", False):
+        if level in MSVC_X86_64_ARCH:
+            return MSVC_X86_64_ARCH[level], []
+        # armv8-a is /arch:armv8.0, armv8.2-a is /arch:armv8.2, ...
+        version = level[len("armv") : -len("-a")]
+        return ["/arch:armv" + (version if "." in version else version + ".0")], []
+    # x86-64-v1 is spelled x86-64, which older compilers also understand.
+    flags = ["-march=" + ("x86-64" if level == "x86-64-v1" else level)]
+    return flags, flags
+
+
+def _apply_level(env, level):
+    env["CPU_LEVEL"] = level
+    env["CPU_LEVEL_FLAGS"], env["CPU_LEVEL_LINKFLAGS"] = cpu_level_flags(env, level)
+
+
+def setup_cpu_level(env, default=None):
+    """Set `$CPU_LEVEL_FLAGS`/`$CPU_LEVEL_LINKFLAGS` for the first `cpu_level`, or `default` if none is set.
+
+    Platform tools add both variables to their flags. When several levels are listed, `cpu_level_variants` builds
+    the others.
+    """
+    levels = parse_cpu_levels(env)
+    env["CPU_LEVELS"] = levels
+    _apply_level(env, levels[0] if levels else default)
+
+
+def cpu_level_variants(env):
+    """Return one environment per level listed in `cpu_level`.
+
+    With a single level, that's `env` itself. With several, each clone gets the level appended to `extra_suffix`
+    and to the object and unity source suffixes, and its own precompiled header if `env.SetupPCH` was called before.
+    """
+    from build.pch import setup_pch
+
+    levels = env.get("CPU_LEVELS", [])
+    if len(levels) <= 1:
+        return [env]
+
+    # Every level builds its own precompiled header, don't build the MSVC one of `env` by default. GCC and Clang
+    # ones are only declared for the objects that use them.
+    pch = env.get("PCH")
+    if pch is not None and hasattr(pch, "dir"):
+        env.Ignore(pch.dir, pch)
+
+    variants = []
+    for level in levels:
+        clone = env.Clone()
+        clone.extra_suffix = env.extra_suffix + "." + level
+        _apply_level(clone, level)
+        # Resolve them all before changing them, SHOBJSUFFIX may refer to OBJSUFFIX.
+        suffixes = {var: clone.subst("$" + var) for var in ("OBJSUFFIX", "SHOBJSUFFIX", "UNITYSUFFIX")}
+        for var, suffix in suffixes.items():
+            clone[var] = "." + level + suffix
+        if "PCH_SETUP" in clone:
+            # Nested in the directory of the build variant, if any.
+            clone["PCH_SUBDIR"] = "/".join(filter(None, (env.get("PCH_SUBDIR"), level)))
+            setup_pch(clone, *clone["PCH_SETUP"])
+        variants.append(clone)
+    return variants
@@ -0,0 +1,30 @@
+import os
+
+from build.object_emitter import C_SUFFIXES, CXX_SUFFIXES, add_object_emitter
+
+LINK_EMITTERS = ("PROGEMITTER", "SHLIBEMITTER", "LDMODULEEMITTER", "LIBEMITTER")
+
+
+def _dwo_emitter(target, source, env):
+    if not env.get("SPLIT_DWARF", False):
+        return target, source
+    # Declare the .dwo files as targets so they are cleaned and stored in the SCons cache with their objects.
+    dwos = [env.File(os.path.splitext(t.abspath)[0] + ".dwo") for t in target]
+    return target + dwos, source
+
+
+def _strip_dwo_emitter(target, source, env):
+    return target, [s for s in source if not str(s).endswith(".dwo")]
+
+
+def setup_split_debug(env):
+    """Emit debug info into .dwo files next to the objects, so objects and links skip most of it."""
+    env["SPLIT_DWARF"] = True
+    env.Append(CCFLAGS=["-gsplit-dwarf"])
+    add_object_emitter(env, _dwo_emitter, CXX_SUFFIXES + C_SUFFIXES)
+    # The .dwo files come along when objects are built implicitly from sources, they aren't linker inputs.
+    for var in LINK_EMITTERS:
+        env.Append(**{var: [_strip_dwo_emitter]})
+    if env.get("linker") in ("gold", "lld", "mold"):
+        # Lets debuggers find symbols without reading every .dwo file.
+        env.Append(LINKFLAGS=["-Wl,--gdb-index"])
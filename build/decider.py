@@ -0,0 +1,150 @@
+import atexit
+import json
+import os
+import threading
+import time
+
+HASH_CACHE_FILE = ".scons_hash_cache"
+# A file modified within this many seconds may still change inside the same mtime tick.
+HASH_CACHE_RACY_SECONDS = 2
+
+DECIDERS = ("content-timestamp", "content", "timestamp-match", "timestamp-newer", "fast")
+HASH_FORMATS = ("auto", "md5", "sha1", "sha256")
+
+_SCONS_DECIDERS = {
+    "content-timestamp": "MD5-timestamp",
+    "content": "MD5",
+    "timestamp-match": "timestamp-match",
+    "timestamp-newer": "timestamp-newer",
+}
+# The node methods behind each of them.
+_NODE_DECIDERS = {
+    "content-timestamp": "changed_timestamp_then_content",
+    "content": "changed_content",
+    "timestamp-match": "changed_timestamp_match",
+    "timestamp-newer": "changed_timestamp_newer",
+}
+
+
+class HashCache:
+    """Persistent map of source paths to their content signature, valid while their size and mtime match.
+
+    Signatures SCons would otherwise compute again, for new targets or files modified in the last `max_drift`
+    seconds, come from here instead of reading the files.
+    """
+
+    def __init__(self, path, algorithm):
+        self.path = path
+        self.algorithm = algorithm
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.dirty = False
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                data = json.load(file)
+            # Signatures of another hash format are useless.
+            if data["algorithm"] == algorithm:
+                self.entries = data["entries"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    @staticmethod
+    def _stat(node):
+        # Both are memoized by the node, the decider runs for every target depending on it.
+        size = node.get_size()
+        return None if size < 0 else [size, node.get_timestamp()]
+
+    def lookup(self, node):
+        entry = self.entries.get(node.get_abspath())
+        if entry is None or entry[:2] != self._stat(node):
+            return None
+        return entry[2]
+
+    def store(self, node, csig):
+        stat = self._stat(node)
+        if stat is None or time.time() - stat[1] < HASH_CACHE_RACY_SECONDS:
+            return
+        entry = stat + [csig]
+        path = node.get_abspath()
+        with self.lock:
+            if self.entries.get(path) != entry:
+                self.entries[path] = entry
+                self.dirty = True
+
+    def save(self):
+        if not self.dirty:
+            return
+        try:
+            with open(self.path + ".tmp", "w", encoding="utf-8") as file:
+                json.dump({"algorithm": self.algorithm, "entries": self.entries}, file, separators=(",", ":"))
+            os.replace(self.path + ".tmp", self.path)
+        except OSError:
+            pass
+
+
+def _immutable_prefixes(env, immutable_paths):
+    prefixes = []
+    for path in immutable_paths.split(","):
+        path = path.strip()
+        if path:
+            prefixes.append(os.path.join(env.Dir("#").Dir(path).abspath, ""))
+    return tuple(prefixes)
+
+
+def _make_decider(name, prefixes, hash_cache):
+    from SCons.Node.FS import File
+
+    method = _NODE_DECIDERS[name]
+
+    def decide(dependency, target, prev_ni, repo_node=None):
+        if prefixes and dependency.srcnode().get_abspath().startswith(prefixes):
+            # Never changes once built against, skip the stat, signature and dependency map lookups.
+            if getattr(prev_ni, "csig", None) or getattr(prev_ni, "timestamp", None):
+                return False
+
+        if hash_cache is None or not isinstance(dependency, File):
+            return getattr(dependency, method)(target, prev_ni, repo_node)
+
+        ninfo = dependency.get_ninfo()
+        if not hasattr(ninfo, "csig"):
+            csig = hash_cache.lookup(dependency)
+            if csig is not None:
+                ninfo.csig = csig
+        changed = getattr(dependency, method)(target, prev_ni, repo_node)
+        csig = getattr(ninfo, "csig", None)
+        if csig:
+            hash_cache.store(dependency, csig)
+        return changed
+
+    return decide
+
+
+def setup_decider(env, name, hash_format="auto", immutable_paths=""):
+    """Select how SCons decides that a dependency changed.
+
+    `fast` behaves like `content-timestamp`, with signatures kept in a persistent cache and SHA-256 signatures by
+    default, which hashlib computes faster than MD5 on CPUs with SHA extensions. Files under `immutable_paths` are
+    assumed to never change once a target was built against them, so null builds skip them entirely. Targets that
+    are up to date record the current signatures, so edits under them are only picked up by a clean build.
+    """
+    from SCons.Script import Decider, GetOption, SetOption
+
+    if hash_format == "auto":
+        hash_format = "sha256" if name == "fast" else None
+    # `--hash-format` on the command line wins.
+    if hash_format and GetOption("hash_format") is None:
+        SetOption("hash_format", hash_format)
+
+    prefixes = _immutable_prefixes(env, immutable_paths)
+    if name != "fast" and not prefixes:
+        Decider(_SCONS_DECIDERS[name])
+        return
+
+    hash_cache = None
+    if name == "fast":
+        hash_cache = HashCache(os.path.join(env.Dir("#").abspath, HASH_CACHE_FILE), GetOption("hash_format") or "md5")
+        atexit.register(hash_cache.save)
+        name = "content-timestamp"
+    Decider(_make_decider(name, prefixes, hash_cache))
+    if prefixes:
+        print("Immutable paths enabled... (paths: '" + "', '".join(prefixes) + "')")
@@ -0,0 +1,146 @@
+import json
+import os
+import re
+
+from build.object_emitter import C_SUFFIXES, CXX_SUFFIXES, add_object_emitter
+from build.task_hooks import add_executed_hook
+
+# Separates the target of a Make rule from its prerequisites, but not a drive letter from its path.
+_RULE_SEPARATOR = re.compile(r":(?:\s|$)")
+# Whitespace not escaped by a backslash separates prerequisites.
+_PREREQUISITE_SEPARATOR = re.compile(r"(?<!\\)\s+")
+
+_scanner = None
+
+
+def parse_make_depfile(content):
+    """Return the prerequisites of the first rule of a Make depfile, as written by `-MMD -MF`."""
+    content = content.replace("\\\r\n", " ").replace("\\\n", " ")
+    rule = content.split("\n", 1)[0]
+    match = _RULE_SEPARATOR.search(rule)
+    if match is None:
+        return []
+    paths = _PREREQUISITE_SEPARATOR.split(rule[match.end() :].strip())
+    return [path.replace("\\ ", " ").replace("\\#", "#").replace("$$", "$") for path in paths if path]
+
+
+def parse_msvc_depfile(content, system_dirs):
+    """Return the includes listed in a `/sourceDependencies` file, without those in `system_dirs`."""
+    includes = json.loads(content)["Data"]["Includes"]
+    return [path for path in includes if not os.path.normcase(path).startswith(system_dirs)]
+
+
+def _read_depfile(env, depfile):
+    try:
+        with open(depfile, "r", encoding="utf-8") as file:
+            content = file.read()
+        if env.get("is_msvc", False):
+            system_dirs = tuple(
+                os.path.join(os.path.normcase(path), "")
+                for path in env["ENV"].get("INCLUDE", "").split(os.pathsep)
+                if path
+            )
+            return parse_msvc_depfile(content, system_dirs)
+        return parse_make_depfile(content)
+    except (OSError, UnicodeDecodeError, ValueError, KeyError, TypeError):
+        return None
+
+
+def _depfile_path(env, dir, target, source):
+    from SCons.Tool import CScanner
+
+    cpppath = CScanner.path(env, dir, target, source)
+    if not env.get("DEPFILES", False) or not target:
+        return (None, None, None) + cpppath
+    depfile = target[0].abspath + env["DEPFILE_SUFFIX"]
+    try:
+        # Part of the path, so scans are redone once the compiler rewrote the depfile.
+        mtime = os.stat(depfile).st_mtime_ns
+    except OSError:
+        # Never built, fall back to the C scanner.
+        return (None, None, None) + cpppath
+    return (depfile, mtime, source[0].srcnode().abspath if source else None) + cpppath
+
+
+def _depfile_scan(node, env, path):
+    from SCons.Tool import CScanner
+
+    depfile, _mtime, source = path[:3]
+    if depfile is None:
+        return CScanner(node, env, path[3:])
+    if node.srcnode().abspath != source:
+        # Headers, the depfile already lists everything they include.
+        return []
+    paths = _read_depfile(env, depfile)
+    if paths is None:
+        return CScanner(node, env, path[3:])
+    top = env.Dir("#")
+    deps = [top.File(p) for p in paths]
+    # Headers removed since the last build are only listed there until the next one, like Make ignores them.
+    return [dep for dep in deps if dep.srcnode() is not node.srcnode() and (dep.exists() or dep.has_builder())]
+
+
+def _get_scanner():
+    global _scanner
+
+    if _scanner is None:
+        from SCons.Scanner import ScannerBase
+        from SCons.Tool import CScanner, CSuffixes, SourceFileScanner
+
+        _scanner = ScannerBase(
+            _depfile_scan,
+            name="DepfileScanner",
+            skeys=CScanner.get_skeys(),
+            path_function=_depfile_path,
+            recursive=True,
+        )
+        # The object builders of every environment share this scanner, environments without `DEPFILES` still get
+        # the C scanner through it.
+        for suffix in CSuffixes:
+            SourceFileScanner.add_scanner(suffix, _scanner)
+        add_executed_hook(_store_depfile_deps)
+    return _scanner
+
+
+def _store_depfile_deps(task):
+    from SCons.Node import executing
+
+    for t in task.targets:
+        if t.get_state() != executing or t.implicit is None or not t.get_build_env().get("DEPFILES", False):
+            continue
+        # Scanned again with the depfile the compiler just wrote, so the dependencies stored for the object are the
+        # ones the next build finds.
+        before = set(t.implicit)
+        t.implicit = None
+        t.scan()
+        for dep in t.implicit:
+            if dep not in before:
+                # Not visited by this build, the signatures stored for it would be empty.
+                dep.get_ninfo().update(dep)
+
+
+def _depfile_emitter(target, source, env):
+    if env.get("DEPFILES", False):
+        for t in target:
+            env.Clean(t, t.abspath + env["DEPFILE_SUFFIX"])
+    return target, source
+
+
+def setup_depfiles(env):
+    """Find the headers of objects in the depfiles the compiler wrote during their last build.
+
+    Objects that were never built are scanned by the C scanner. Nothing is lost by relying on the previous depfile,
+    as any change to the headers an object includes changes its source or one of the headers it listed. Once built,
+    an object is scanned again with its new depfile, between tasks, so the dependencies stored for it are the ones
+    the next build finds and a build changing nothing rebuilds nothing.
+    """
+    if env.get("is_msvc", False):
+        # Visual Studio 2019 16.7 and later.
+        env.Append(CCFLAGS=["/sourceDependencies", "${TARGET}.json"])
+        env["DEPFILE_SUFFIX"] = ".json"
+    else:
+        env.Append(CCFLAGS=["-MMD", "-MF", "${TARGET}.d"])
+        env["DEPFILE_SUFFIX"] = ".d"
+    env["DEPFILES"] = True
+    _get_scanner()
+    add_object_emitter(env, _depfile_emitter, CXX_SUFFIXES + C_SUFFIXES)
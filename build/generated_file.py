@@ -0,0 +1,19 @@
+GENERATED_HEADER = "/* THIS FILE IS GENERATED. EDITS WILL BE LOST. */\n\n"
+
+
+def write_generated_file(path, content):
+    """Write a generated source file, leaving it untouched when its content didn't change.
+
+    Returns whether the file was written. Targets need to be `Precious`, otherwise SCons removes them before
+    running the builder and they are always rewritten.
+    """
+    content = GENERATED_HEADER + content
+    try:
+        with open(path, "rt", encoding="utf-8", newline="\n") as file:
+            if file.read() == content:
+                return False
+    except (OSError, UnicodeDecodeError):
+        pass
+    with open(path, "wt", encoding="utf-8", newline="\n") as file:
+        file.write(content)
+    return True
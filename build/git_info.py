@@ -1,42 +1,26 @@
+import glob
+import heapq
+import json
 import os
 import subprocess
+import zlib
 
+from build.generated_file import write_generated_file
 
-def get_git_tag():
-    git_tag = os.getenv("OPENVIC_TAG", "<tag missing>")
-    if os.path.exists(".git"):
-        try:
-            result = subprocess.check_output(["git", "describe", "--tags", "--abbrev=0"], encoding="utf-8").strip()
-            if result != "":
-                git_tag = result
-        except (subprocess.CalledProcessError, OSError):
-            # `git` not found in PATH.
-            pass
-
-    return git_tag
-
+GIT_INFO_CACHE_FILE = ".scons_git_info"
+# `gh` needs the network and may hang, so it's opt-in and bounded.
+GH_TIMEOUT = 5
+# Maximum number of commits walked looking for the closest tag.
+DESCRIBE_MAX_COMMITS = 10000
+DESCRIBE_MAX_CANDIDATES = 10
 
-def get_git_release():
-    git_release = os.getenv("OPENVIC_RELEASE", "<release missing>")
-    if os.path.exists(".git"):
-        try:
-            result = subprocess.check_output(
-                ["gh", "release", "list", "--json", "name", "-q", ".[0] | .name"], encoding="utf-8"
-            ).strip()
-            if result != "":
-                git_release = result
-        except (subprocess.CalledProcessError, OSError):
-            # `gh` not found in PATH.
-            git_tag = get_git_tag()
-            if git_tag != "<tag missing>":
-                git_release = git_tag
+_OBJ_TYPES = {1: "commit", 2: "tree", 3: "blob", 4: "tag"}
 
-    return git_release
+_git_info = None
 
 
-def get_git_hash():
-    # Parse Git hash if we're in a Git repo.
-    git_hash = "0000000000000000000000000000000000000000"
+def get_git_folders():
+    """Return `(git_folder, common_folder)`, following `.git` files and worktrees, or `(None, None)`."""
     git_folder = ".git"
 
     if os.path.isfile(".git"):
@@ -45,47 +29,398 @@ def get_git_hash():
         if module_folder.startswith("gitdir: "):
             git_folder = module_folder[8:]
 
-    if os.path.isfile(os.path.join(git_folder, "HEAD")):
-        with open(os.path.join(git_folder, "HEAD"), "r", encoding="utf8") as file:
-            head = file.readline().strip()
-        if head.startswith("ref: "):
-            ref = head[5:]
-            # If this directory is a Git worktree instead of a root clone.
-            parts = git_folder.split("/")
-            if len(parts) > 2 and parts[-2] == "worktrees":
-                git_folder = "/".join(parts[0:-2])
-            head = os.path.join(git_folder, ref)
-            packedrefs = os.path.join(git_folder, "packed-refs")
-            if os.path.isfile(head):
-                with open(head, "r", encoding="utf-8") as file:
-                    git_hash = file.readline().strip()
-            elif os.path.isfile(packedrefs):
-                # Git may pack refs into a single file. This code searches .git/packed-refs file for the current ref's hash.
-                # https://mirrors.edge.kernel.org/pub/software/scm/git/docs/git-pack-refs.html
-                for line in open(packedrefs, "r", encoding="utf-8").read().splitlines():
-                    if line.startswith("#"):
-                        continue
-                    (line_hash, line_ref) = line.split(" ")
-                    if ref == line_ref:
-                        git_hash = line_hash
-                        break
+    if not os.path.isfile(os.path.join(git_folder, "HEAD")):
+        return None, None
+
+    common_folder = git_folder
+    commondir = os.path.join(git_folder, "commondir")
+    if os.path.isfile(commondir):
+        with open(commondir, "r", encoding="utf-8") as file:
+            common_folder = os.path.normpath(os.path.join(git_folder, file.readline().strip()))
+    else:
+        # If this directory is a Git worktree instead of a root clone.
+        parts = git_folder.split("/")
+        if len(parts) > 2 and parts[-2] == "worktrees":
+            common_folder = "/".join(parts[0:-2])
+
+    return git_folder, common_folder
+
+
+def _read_packed_refs(common_folder):
+    """Return `{ref: (hash, peeled_hash)}` from packed-refs."""
+    # Git may pack refs into a single file.
+    # https://mirrors.edge.kernel.org/pub/software/scm/git/docs/git-pack-refs.html
+    refs = {}
+    packedrefs = os.path.join(common_folder, "packed-refs")
+    if not os.path.isfile(packedrefs):
+        return refs
+    last_ref = None
+    with open(packedrefs, "r", encoding="utf-8") as file:
+        for line in file.read().splitlines():
+            if line.startswith("#") or not line:
+                continue
+            if line.startswith("^"):
+                if last_ref is not None:
+                    refs[last_ref] = (refs[last_ref][0], line[1:])
+                continue
+            (line_hash, line_ref) = line.split(" ", 1)
+            refs[line_ref] = (line_hash, None)
+            last_ref = line_ref
+    return refs
+
+
+def _resolve_ref(git_folder, common_folder, ref, packed_refs):
+    for folder in (git_folder, common_folder):
+        path = os.path.join(folder, ref)
+        if os.path.isfile(path):
+            with open(path, "r", encoding="utf-8") as file:
+                return file.readline().strip()
+    if ref in packed_refs:
+        return packed_refs[ref][0]
+    return None
+
+
+def _read_head(git_folder):
+    with open(os.path.join(git_folder, "HEAD"), "r", encoding="utf8") as file:
+        return file.readline().strip()
+
+
+class GitObjectReader:
+    """Minimal reader for loose and packed (v2 index) git objects."""
+
+    def __init__(self, common_folder):
+        self.objects_folder = os.path.join(common_folder, "objects")
+        self.packs = None
+
+    def _load_packs(self):
+        self.packs = []
+        for idx_path in sorted(glob.glob(os.path.join(self.objects_folder, "pack", "*.idx"))):
+            with open(idx_path, "rb") as file:
+                idx = file.read()
+            if idx[:4] != b"\377tOc" or int.from_bytes(idx[4:8], "big") != 2:
+                continue
+            count = int.from_bytes(idx[8 + 255 * 4 : 8 + 256 * 4], "big")
+            self.packs.append((idx, count, idx_path[:-4] + ".pack"))
+
+    def _find_in_pack(self, binsha):
+        if self.packs is None:
+            self._load_packs()
+        for idx, count, pack_path in self.packs:
+            first = binsha[0]
+            lo = int.from_bytes(idx[8 + (first - 1) * 4 : 8 + first * 4], "big") if first else 0
+            hi = int.from_bytes(idx[8 + first * 4 : 12 + first * 4], "big")
+            names = 8 + 256 * 4
+            while lo < hi:
+                mid = (lo + hi) // 2
+                name = idx[names + mid * 20 : names + mid * 20 + 20]
+                if name < binsha:
+                    lo = mid + 1
+                elif name > binsha:
+                    hi = mid
+                else:
+                    offsets = names + count * 24
+                    offset = int.from_bytes(idx[offsets + mid * 4 : offsets + mid * 4 + 4], "big")
+                    if offset & 0x80000000:
+                        large = offsets + count * 4 + (offset & 0x7FFFFFFF) * 8
+                        offset = int.from_bytes(idx[large : large + 8], "big")
+                    return pack_path, offset
+        return None
+
+    def _read_pack_entry(self, pack_path, offset):
+        with open(pack_path, "rb") as file:
+            file.seek(offset)
+            header = file.read(32)
+            c = header[0]
+            obj_type = (c >> 4) & 7
+            pos = 1
+            while c & 0x80:
+                c = header[pos]
+                pos += 1
+
+            base = None
+            if obj_type == 6:  # OFS_DELTA
+                c = header[pos]
+                pos += 1
+                base_offset = c & 0x7F
+                while c & 0x80:
+                    c = header[pos]
+                    pos += 1
+                    base_offset = ((base_offset + 1) << 7) | (c & 0x7F)
+                base = self._read_pack_entry(pack_path, offset - base_offset)
+            elif obj_type == 7:  # REF_DELTA
+                base = self.read(header[pos : pos + 20].hex())
+                pos += 20
+
+            file.seek(offset + pos)
+            decompressor = zlib.decompressobj()
+            data = b""
+            while not decompressor.eof:
+                chunk = file.read(16384)
+                if not chunk:
+                    break
+                data += decompressor.decompress(chunk)
+
+        if base is None:
+            return _OBJ_TYPES[obj_type], data
+        return base[0], _apply_delta(base[1], data)
+
+    def read(self, sha):
+        """Return `(type, data)` for the object `sha`."""
+        loose = os.path.join(self.objects_folder, sha[:2], sha[2:])
+        if os.path.isfile(loose):
+            with open(loose, "rb") as file:
+                raw = zlib.decompress(file.read())
+            header, _, data = raw.partition(b"\0")
+            return header.split(b" ")[0].decode(), data
+
+        found = self._find_in_pack(bytes.fromhex(sha))
+        if found is None:
+            raise KeyError(sha)
+        return self._read_pack_entry(*found)
+
+
+def _apply_delta(base, delta):
+    def varint(pos):
+        value = shift = 0
+        while True:
+            c = delta[pos]
+            pos += 1
+            value |= (c & 0x7F) << shift
+            shift += 7
+            if not c & 0x80:
+                return value, pos
+
+    _, pos = varint(0)
+    _, pos = varint(pos)
+    result = bytearray()
+    while pos < len(delta):
+        op = delta[pos]
+        pos += 1
+        if op & 0x80:
+            copy_offset = copy_size = 0
+            for i in range(4):
+                if op & (1 << i):
+                    copy_offset |= delta[pos] << (8 * i)
+                    pos += 1
+            for i in range(3):
+                if op & (1 << (4 + i)):
+                    copy_size |= delta[pos] << (8 * i)
+                    pos += 1
+            result += base[copy_offset : copy_offset + (copy_size or 0x10000)]
         else:
-            git_hash = head
+            result += delta[pos : pos + op]
+            pos += op
+    return bytes(result)
+
+
+def _parse_object_headers(data):
+    headers = {}
+    for line in data.split(b"\n\n", 1)[0].decode("utf-8", "replace").splitlines():
+        key, _, value = line.partition(" ")
+        headers.setdefault(key, []).append(value)
+    return headers
+
+
+def _commit_timestamp(headers):
+    # committer Name <email> 1700000000 +0000
+    return int(headers["committer"][0].rsplit(" ", 2)[-2])
+
+
+def _list_tags(common_folder, packed_refs):
+    tags = {ref: value for ref, value in packed_refs.items() if ref.startswith("refs/tags/")}
+    tags_folder = os.path.join(common_folder, "refs", "tags")
+    for root, _dirs, files in os.walk(tags_folder):
+        for name in files:
+            path = os.path.join(root, name)
+            ref = "refs/tags/" + os.path.relpath(path, tags_folder).replace("\\", "/")
+            with open(path, "r", encoding="utf-8") as file:
+                tags[ref] = (file.readline().strip(), None)
+    return tags
+
+
+def _describe(reader, head_hash, tags):
+    """Equivalent of `git describe --tags --abbrev=0`: the tag closest to `head_hash`, walking newest commits first."""
+    tagged = {}
+    for ref, (tag_hash, peeled) in tags.items():
+        annotated = peeled is not None
+        commit = peeled
+        if commit is None:
+            obj_type, data = reader.read(tag_hash)
+            while obj_type == "tag":
+                annotated = True
+                commit = _parse_object_headers(data)["object"][0]
+                obj_type, data = reader.read(commit)
+            commit = commit or tag_hash
+        tagged.setdefault(commit, []).append((annotated, ref[len("refs/tags/") :]))
+
+    if not tagged:
+        return None
+
+    # Same search as git's describe.c: walk commits newest first, propagating a flag per candidate tag to the
+    # commits it can reach. A candidate's depth is the number of walked commits it can't reach.
+    parents = {}
+    flags = {head_hash: 0}
+    candidates = []
+    order = 0
 
-    # Get the UNIX timestamp of the build commit.
+    def push(queue, commit):
+        nonlocal order
+        headers = _parse_object_headers(reader.read(commit)[1])
+        parents[commit] = headers.get("parent", [])
+        # Ties keep insertion order, like commit_list_insert_by_date.
+        heapq.heappush(queue, (-_commit_timestamp(headers), order, commit))
+        order += 1
+
+    queue = []
+    push(queue, head_hash)
+    seen_commits = 0
+    while queue and seen_commits < DESCRIBE_MAX_COMMITS:
+        commit = heapq.heappop(queue)[2]
+        seen_commits += 1
+        if commit in tagged and len(candidates) < DESCRIBE_MAX_CANDIDATES:
+            flag = 1 << len(candidates)
+            # Annotated tags win over lightweight ones on the same commit.
+            candidates.append({"name": max(tagged[commit])[1], "flag": flag, "depth": seen_commits - 1})
+            flags[commit] |= flag
+        for candidate in candidates:
+            if not flags[commit] & candidate["flag"]:
+                candidate["depth"] += 1
+        for parent in parents[commit]:
+            if parent not in flags:
+                flags[parent] = flags[commit]
+                push(queue, parent)
+            else:
+                flags[parent] |= flags[commit]
+        # Once every candidate reaches everything left to walk, no depth can change anymore, and any tag found
+        # further down would be deeper than the candidates we have.
+        all_flags = (1 << len(candidates)) - 1
+        if candidates and all(flags[c[2]] & all_flags == all_flags for c in queue):
+            break
+
+    if not candidates:
+        return None
+    return min(candidates, key=lambda c: c["depth"])["name"]
+
+
+def _read_git_info(git_folder, common_folder):
+    git_hash = "0000000000000000000000000000000000000000"
     git_timestamp = 0
-    if os.path.exists(".git"):
+    git_tag = None
+
+    packed_refs = _read_packed_refs(common_folder)
+    head = _read_head(git_folder)
+    if head.startswith("ref: "):
+        git_hash = _resolve_ref(git_folder, common_folder, head[5:], packed_refs) or git_hash
+    else:
+        git_hash = head
+
+    reader = GitObjectReader(common_folder)
+    try:
+        git_timestamp = _commit_timestamp(_parse_object_headers(reader.read(git_hash)[1]))
+        git_tag = _describe(reader, git_hash, _list_tags(common_folder, packed_refs))
+    except (OSError, KeyError, IndexError, ValueError, zlib.error):
+        # Unsupported repository layout, let `git` handle it.
         try:
-            git_timestamp = subprocess.check_output(
-                ["git", "log", "-1", "--pretty=format:%ct", "--no-show-signature", git_hash], encoding="utf-8"
+            git_timestamp = int(
+                subprocess.check_output(
+                    ["git", "log", "-1", "--pretty=format:%ct", "--no-show-signature", git_hash], encoding="utf-8"
+                )
             )
-        except (subprocess.CalledProcessError, OSError):
+            git_tag = subprocess.check_output(["git", "describe", "--tags", "--abbrev=0"], encoding="utf-8").strip()
+        except (subprocess.CalledProcessError, OSError, ValueError):
             # `git` not found in PATH.
             pass
 
+    return {"git_hash": git_hash, "git_timestamp": git_timestamp, "git_tag": git_tag or None}
+
+
+def _cache_key(git_folder, common_folder):
+    # Reading the refs is cheap next to walking the history, and catches tags moved or added in nested folders.
+    packed_refs = _read_packed_refs(common_folder)
+    head = _read_head(git_folder)
     return {
-        "git_hash": git_hash,
-        "git_timestamp": git_timestamp,
+        "git_folder": os.path.abspath(git_folder),
+        "head": head,
+        "hash": _resolve_ref(git_folder, common_folder, head[5:], packed_refs) if head.startswith("ref: ") else head,
+        "tags": sorted([ref, tag_hash] for ref, (tag_hash, _peeled) in _list_tags(common_folder, packed_refs).items()),
+        "env": [os.getenv("OPENVIC_TAG"), os.getenv("OPENVIC_RELEASE"), os.getenv("OPENVIC_GH_RELEASE")],
+    }
+
+
+def _get_cached_git_info():
+    global _git_info
+
+    if _git_info is not None:
+        return _git_info
+
+    git_folder, common_folder = get_git_folders()
+    if git_folder is None:
+        return None
+
+    key = _cache_key(git_folder, common_folder)
+    try:
+        with open(GIT_INFO_CACHE_FILE, "r", encoding="utf-8") as file:
+            cached = json.load(file)
+        if cached["key"] == key:
+            _git_info = cached["info"]
+            return _git_info
+    except (OSError, ValueError, KeyError):
+        pass
+
+    info = _read_git_info(git_folder, common_folder)
+    info["git_release"] = _get_gh_release()
+    try:
+        with open(GIT_INFO_CACHE_FILE, "w", encoding="utf-8") as file:
+            json.dump({"key": key, "info": info}, file)
+    except OSError:
+        pass
+    _git_info = info
+    return info
+
+
+def _get_gh_release():
+    if os.getenv("OPENVIC_GH_RELEASE", "") not in ("1", "yes", "true"):
+        return None
+    try:
+        result = subprocess.check_output(
+            ["gh", "release", "list", "--json", "name", "-q", ".[0] | .name"], encoding="utf-8", timeout=GH_TIMEOUT
+        ).strip()
+        return result or None
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired, OSError):
+        # `gh` not found in PATH, not authenticated or unreachable.
+        return None
+
+
+def get_git_tag():
+    git_tag = os.getenv("OPENVIC_TAG", "<tag missing>")
+    info = _get_cached_git_info()
+    if info is not None and info["git_tag"]:
+        git_tag = info["git_tag"]
+
+    return git_tag
+
+
+def get_git_release():
+    """Return the latest GitHub release name when `OPENVIC_GH_RELEASE=1`, otherwise the closest tag."""
+    git_release = os.getenv("OPENVIC_RELEASE", "<release missing>")
+    info = _get_cached_git_info()
+    if info is not None:
+        if info["git_release"]:
+            git_release = info["git_release"]
+        elif info["git_tag"]:
+            git_release = info["git_tag"]
+
+    return git_release
+
+
+def get_git_hash():
+    info = _get_cached_git_info()
+    if info is None:
+        return {"git_hash": "0000000000000000000000000000000000000000", "git_timestamp": 0}
+
+    return {
+        "git_hash": info["git_hash"],
+        "git_timestamp": info["git_timestamp"],
     }
 
 
@@ -94,15 +429,35 @@ def get_git_info():
 
 
 def git_builder(target, source, env):
+    """Write the git info header, given as the first target.
+
+    If a `.cpp` is given as a second target, the values that change with every commit (release, hash, timestamp)
+    are defined there and only declared `extern` in the header, so a new commit recompiles that file and relinks,
+    instead of recompiling everything that includes the header.
+    """
     name_prefix = env.get("name_prefix", "project")
     prefix_upper = name_prefix.upper()
 
     git_info = source[0].read()
 
-    with open(str(target[0]), "wt", encoding="utf-8", newline="\n") as file:
-        file.write("/* THIS FILE IS GENERATED. EDITS WILL BE LOST. */\n\n")
-        file.write(
-            f"""\
+    # (type, name, value)
+    volatile = [
+        ("std::string_view", f"{prefix_upper}_RELEASE", f'"{git_info["git_release"]}"'),
+        ("std::string_view", f"{prefix_upper}_COMMIT_HASH", f'"{git_info["git_hash"]}"'),
+        ("const uint64_t", f"{prefix_upper}_COMMIT_TIMESTAMP", f"{git_info['git_timestamp']}ull"),
+    ]
+
+    header_path = str(target[0])
+    source_path = str(target[1]) if len(target) > 1 else None
+
+    if source_path is None:
+        values = "".join(f"\tstatic constexpr {type} {name} = {value};\n" for type, name, value in volatile)
+    else:
+        values = "".join(f"\textern const {type.replace('const ', '')} {name};\n" for type, name, value in volatile)
+
+    write_generated_file(
+        header_path,
+        f"""\
 #pragma once
 
 #include <cstdint>
@@ -110,9 +465,21 @@ def git_builder(target, source, env):
 
 namespace OpenVic {{
 	static constexpr std::string_view {prefix_upper}_TAG = "{git_info["git_tag"]}";
-	static constexpr std::string_view {prefix_upper}_RELEASE = "{git_info["git_release"]}";
-	static constexpr std::string_view {prefix_upper}_COMMIT_HASH = "{git_info["git_hash"]}";
-	static constexpr const uint64_t {prefix_upper}_COMMIT_TIMESTAMP = {git_info["git_timestamp"]}ull;
-}}
-"""
+{values}}}
+""",
+    )
+
+    if source_path is not None:
+        include = os.path.relpath(header_path, os.path.dirname(source_path)).replace("\\", "/")
+        definitions = "".join(
+            f"\textern const {type.replace('const ', '')} {name} = {value};\n" for type, name, value in volatile
+        )
+        write_generated_file(
+            source_path,
+            f"""\
+#include "{include}"
+
+namespace OpenVic {{
+{definitions}}}
+""",
         )
@@ -1,33 +1,133 @@
-def GlobRecursive(pattern, nodes=["."], exclude=None):
-    import fnmatch
-    import os
+import atexit
+import fnmatch
+import json
+import os
+import re
+import time
+
+GLOB_INDEX_FILE = ".scons_glob_index"
+# A directory modified within this many seconds may still change inside the same mtime tick.
+GLOB_INDEX_RACY_SECONDS = 2
+
+_index = None
+_index_path = None
+_index_dirty = False
+
+
+def _compile_patterns(patterns):
+    """Compile fnmatch patterns into a single matcher, with the same case handling as `fnmatch.fnmatch`."""
+    regex = re.compile("|".join(fnmatch.translate(os.path.normcase(p)) for p in patterns))
+    return lambda name: regex.match(os.path.normcase(name)) is not None
+
+
+def _get_index():
+    global _index, _index_path
+
+    if _index is None:
+        import SCons
+
+        _index_path = os.path.join(SCons.Node.FS.get_default_fs().Dir("#").abspath, GLOB_INDEX_FILE)
+        try:
+            with open(_index_path, "r", encoding="utf-8") as file:
+                _index = json.load(file)
+        except (OSError, ValueError):
+            _index = {}
+        atexit.register(_save_index)
+    return _index
+
+
+def _save_index():
+    if not _index_dirty:
+        return
+    try:
+        with open(_index_path + ".tmp", "w", encoding="utf-8") as file:
+            json.dump(_index, file, separators=(",", ":"))
+        os.replace(_index_path + ".tmp", _index_path)
+    except OSError:
+        pass
+
+
+def _list_dir(path):
+    """Return the sorted (files, dirs) of `path`, reusing the index while the directory mtime is unchanged."""
+    global _index_dirty
+
+    index = _get_index()
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return [], []
+
+    entry = index.get(path)
+    if entry is not None and entry[0] == mtime:
+        return entry[1], entry[2]
+
+    files = []
+    dirs = []
+    try:
+        with os.scandir(path) as it:
+            for e in it:
+                if e.name.startswith("."):
+                    continue
+                try:
+                    (dirs if e.is_dir() else files).append(e.name)
+                except OSError:
+                    continue
+    except OSError:
+        return [], []
+    files.sort()
+    dirs.sort()
 
+    if time.time() - mtime / 1e9 > GLOB_INDEX_RACY_SECONDS:
+        index[path] = [mtime, files, dirs]
+        _index_dirty = True
+    return files, dirs
+
+
+def _walk(path, dir_node, match, results):
     import SCons
 
-    fs = SCons.Node.FS.get_default_fs()
-    Glob = fs.Glob
+    files, dirs = _list_dir(path)
+    entries = dir_node.entries if dir_node is not None else {}
+    for name in dirs:
+        child = entries.get(os.path.normcase(name))
+        _walk(os.path.join(path, name), child if isinstance(child, SCons.Node.FS.Dir) else None, match, results)
+    names = [name for name in files if match(name)]
+    # Generated sources declared earlier in the build don't exist on disk yet, but Glob always returned them.
+    on_disk = set(names)
+    for node in entries.values():
+        if isinstance(node, (SCons.Node.FS.File, SCons.Node.FS.Entry)) and node.has_builder():
+            if node.name not in on_disk and match(node.name):
+                names.append(node.name)
+    results += [os.path.join(path, name) for name in sorted(names)]
 
-    if isinstance(exclude, str):
-        exclude = [exclude]
 
-    results = []
-    for node in nodes:
-        node_str = str(node)
+def GlobRecursive(pattern, nodes=["."], exclude=None):
+    import SCons
 
-        for f in Glob(node_str + "/*", source=True):
-            if type(f) is SCons.Node.FS.Dir:
-                child = node_str + "/" + os.path.basename(str(f))
-                results += GlobRecursive(pattern, [child])
+    fs = SCons.Node.FS.get_default_fs()
 
-        results += Glob(node_str + "/" + pattern)
+    patterns = [pattern] if isinstance(pattern, str) else list(pattern)
+    match = _compile_patterns(patterns)
 
-    if isinstance(exclude, list):
+    if isinstance(exclude, str):
+        exclude = [exclude]
 
-        def norm(s):
-            return str(s).replace("\\", "/")
+    def norm(s):
+        return str(s).replace("\\", "/")
 
-        norm_exclude = [norm(p) for p in exclude]
-        results = [r for r in results if not any(fnmatch.fnmatch(norm(r), p) for p in norm_exclude)]
+    exclude_match = _compile_patterns([norm(p) for p in exclude]) if isinstance(exclude, list) and exclude else None
+
+    results = []
+    for node in nodes:
+        dir_node = fs.Dir(str(node))
+        src_node = dir_node.srcnode()
+        src_abs = src_node.abspath
+        paths = []
+        _walk(src_abs, src_node, match, paths)
+        for path in paths:
+            f = dir_node.File(os.path.relpath(path, src_abs))
+            if exclude_match is None or not exclude_match(norm(f)):
+                results.append(f)
     return results
 
 
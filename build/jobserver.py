@@ -0,0 +1,150 @@
+import atexit
+import contextlib
+import os
+import re
+import select
+import shutil
+import tempfile
+import threading
+
+from build.task_hooks import add_execute_hook, spawns_process
+
+_AUTH_PATTERN = re.compile(r"--jobserver-(?:auth|fds)=(\S+)")
+_JOBS_PATTERN = re.compile(r"(?:^|\s)-j(\d+)")
+
+
+class Jobserver:
+    """Client side of the GNU make jobserver protocol.
+
+    Every running job holds one token. The first job runs on the implicit token each process owns, any other job
+    reads a token from the jobserver before starting and writes it back when done.
+    """
+
+    def __init__(self, read_fd, write_fd):
+        self.read_fd = read_fd
+        self.write_fd = write_fd
+        self.lock = threading.Lock()
+        self.implicit_free = True
+
+    def acquire(self):
+        with self.lock:
+            if self.implicit_free:
+                self.implicit_free = False
+                return None
+        while True:
+            try:
+                return os.read(self.read_fd, 1)
+            except BlockingIOError:
+                # Make may hand out a non-blocking descriptor, several waiters can be woken for one token.
+                select.select([self.read_fd], [], [])
+
+    def release(self, token):
+        if token is None:
+            with self.lock:
+                self.implicit_free = True
+        elif token:
+            os.write(self.write_fd, token)
+
+    @contextlib.contextmanager
+    def token(self, task):
+        if not spawns_process(task):
+            # Aliases, values and Python actions don't compete for CPUs with the rest of the process tree.
+            yield
+            return
+        token = self.acquire()
+        try:
+            yield
+        finally:
+            self.release(token)
+
+
+def parse_makeflags(makeflags):
+    """Return `("fifo", path)`, `("pipe", (read_fd, write_fd))` or `None` from a MAKEFLAGS value."""
+    matches = _AUTH_PATTERN.findall(makeflags or "")
+    if not matches:
+        return None
+    # Make appends its own flags last, they take precedence.
+    auth = matches[-1]
+    if auth.startswith("fifo:"):
+        return ("fifo", auth[len("fifo:") :])
+    fds = auth.split(",")
+    if len(fds) == 2 and all(fd.isdigit() for fd in fds):
+        return ("pipe", (int(fds[0]), int(fds[1])))
+    # Windows semaphores aren't supported.
+    return None
+
+
+def has_jobserver():
+    return os.name == "posix" and parse_makeflags(os.environ.get("MAKEFLAGS")) is not None
+
+
+def jobserver_jobs():
+    """Return the total job count the outer jobserver was started with, if it tells us."""
+    matches = _JOBS_PATTERN.findall(os.environ.get("MAKEFLAGS", ""))
+    return int(matches[-1]) if matches else None
+
+
+def _connect(auth):
+    kind, value = auth
+    if kind == "fifo":
+        try:
+            fd = os.open(value, os.O_RDWR)
+        except OSError:
+            return None, None
+        return Jobserver(fd, fd), os.environ["MAKEFLAGS"]
+    read_fd, write_fd = value
+    try:
+        os.fstat(read_fd)
+        os.fstat(write_fd)
+    except OSError:
+        # Make only passes the descriptors to recipes marked with `+` or using `$(MAKE)`.
+        return None, None
+    makeflags = None
+    if os.path.isdir("/proc/self/fd"):
+        # Commands are spawned with their descriptors closed, hand sub-builds the pipe as a path instead.
+        jobs = jobserver_jobs()
+        makeflags = "-j{} --jobserver-auth=fifo:/proc/{}/fd/{}".format(jobs or "", os.getpid(), read_fd)
+    return Jobserver(read_fd, write_fd), makeflags
+
+
+def _serve(num_jobs):
+    directory = tempfile.mkdtemp(prefix="scons-jobserver-")
+    path = os.path.join(directory, "fifo")
+    os.mkfifo(path, 0o600)
+    fd = os.open(path, os.O_RDWR)
+    os.write(fd, b"+" * (num_jobs - 1))
+
+    def cleanup():
+        os.close(fd)
+        shutil.rmtree(directory, ignore_errors=True)
+
+    atexit.register(cleanup)
+    return Jobserver(fd, fd), "-j{} --jobserver-auth=fifo:{}".format(num_jobs, path)
+
+
+def setup_jobserver(env, mode, num_jobs):
+    """Take part in the GNU make jobserver protocol.
+
+    If an outer make or ninja provides a jobserver, every task running a command takes one of its tokens. Otherwise,
+    with `mode` "serve", this build becomes the jobserver for `num_jobs` tokens. Either way sub-builds spawned from
+    commands share the same tokens through MAKEFLAGS.
+    """
+    if os.name != "posix" or mode == "no":
+        return
+
+    auth = parse_makeflags(os.environ.get("MAKEFLAGS"))
+    if auth is not None:
+        jobserver, makeflags = _connect(auth)
+        if jobserver is None:
+            print("Jobserver from MAKEFLAGS is not accessible, mark the recipe with '+' to share it.")
+            return
+        print("Jobserver client enabled... (MAKEFLAGS: '" + os.environ["MAKEFLAGS"].strip() + "')")
+    elif mode == "serve" and num_jobs > 1:
+        jobserver, makeflags = _serve(num_jobs)
+    else:
+        return
+
+    if makeflags is not None:
+        env["ENV"]["MAKEFLAGS"] = makeflags
+    # Outermost hook, time spent waiting for a token isn't part of the task.
+    add_execute_hook(jobserver.token, priority=-100)
@@ -0,0 +1,136 @@
+import atexit
+import json
+import os
+import re
+import subprocess
+from typing import Set
+
+LAUNCHERS = ("ccache", "sccache")
+
+# Variables the launchers read their configuration and cache location from.
+_PASSTHROUGH_ENV = ("HOME", "USERPROFILE", "LOCALAPPDATA", "APPDATA", "XDG_CACHE_HOME", "XDG_CONFIG_HOME", "TMPDIR")
+
+_COMPILER_VARIABLE = re.compile(r"\$(SHCXX|SHCC|CXX|CC)\b")
+
+# Launchers whose statistics are reported at exit, once however many environments use them.
+_reported: Set[str] = set()
+
+
+def strip_launcher(command):
+    """Remove a leading ccache/sccache from a compiler command given as a list of arguments."""
+    while command and os.path.splitext(os.path.basename(command[0]))[0] in LAUNCHERS:
+        command = command[1:]
+    return command
+
+
+def _split_hand_wrapped(env):
+    """Move a launcher wrapped by hand into `CC`/`CXX` (e.g. `CC="ccache gcc"`) out of the compiler variables."""
+    found = None
+    for var in ("CC", "CXX", "SHCC", "SHCXX"):
+        value = env.get(var)
+        if not isinstance(value, str):
+            continue
+        command = value.split()
+        stripped = strip_launcher(command)
+        if stripped != command and stripped:
+            found = os.path.splitext(os.path.basename(command[0]))[0]
+            env[var] = " ".join(stripped)
+    return found
+
+
+def setup_compiler_launcher(env, launcher):
+    """Wrap the compile commands with ccache or sccache, leaving `CC`/`CXX` untouched."""
+    hand_wrapped = _split_hand_wrapped(env)
+    if launcher == "none":
+        if hand_wrapped is None:
+            return
+        launcher = hand_wrapped
+
+    if launcher == "auto":
+        names = [hand_wrapped] if hand_wrapped else []
+        names += LAUNCHERS
+        path = next((p for p in (env.WhereIs(name) for name in names) if p), None)
+        if path is None:
+            print("No compiler launcher found, building without one.")
+            return
+    else:
+        path = env.WhereIs(launcher)
+        if path is None:
+            print("Compiler launcher '{}' not found.".format(launcher))
+            env.Exit(1)
+    name = os.path.splitext(os.path.basename(path))[0]
+
+    for var in os.environ:
+        if var in _PASSTHROUGH_ENV or var.startswith(name.upper() + "_"):
+            env["ENV"].setdefault(var, os.environ[var])
+
+    top = env.Dir("#").abspath
+    if name == "ccache":
+        # Rewrite absolute paths under the project to relative ones and ignore the working directory,
+        # so separate checkouts and worktrees share cache entries.
+        env["ENV"].setdefault("CCACHE_BASEDIR", top)
+        env["ENV"].setdefault("CCACHE_NOHASHDIR", "1")
+        if env.get("use_pch", False):
+            env["ENV"].setdefault("CCACHE_SLOPPINESS", "pch_defines,time_macros")
+
+    if env.get("is_msvc", False):
+        # Launchers can't cache objects that write into a shared PDB, embed debug info in the objects instead.
+        for var in ("CCFLAGS", "CFLAGS", "CXXFLAGS"):
+            if var in env:
+                env[var] = ["/Z7" if flag == "/Zi" else flag for flag in env.Flatten(env[var]) if flag != "/FS"]
+    else:
+        from build.toolchain import supports_flag
+
+        if supports_flag(env, "-fdebug-prefix-map=/probe=."):
+            env.Append(CCFLAGS=["-fdebug-prefix-map=" + top + "=."])
+
+    env["COMPILER_LAUNCHER"] = path
+    for var in ("CCCOM", "SHCCCOM", "CXXCOM", "SHCXXCOM"):
+        env[var] = _COMPILER_VARIABLE.sub(r"$COMPILER_LAUNCHER $\1", env[var], count=1)
+
+    # Variants and CPU levels set up the launcher of each of their environments.
+    if path not in _reported:
+        _reported.add(path)
+        before = launcher_stats(env, name)
+        atexit.register(print_cache_stats, env, name, before)
+        print("Compiler launcher enabled... (path: '" + path + "')")
+
+
+def launcher_stats(env, name):
+    """Return the launcher's cumulative `(hits, misses)`, or `None` when they can't be queried."""
+    try:
+        if name == "ccache":
+            output = subprocess.check_output(
+                [env["COMPILER_LAUNCHER"], "--print-stats"],
+                stderr=subprocess.DEVNULL,
+                env=env["ENV"],
+            ).decode("utf-8")
+            stats = dict(line.split("\t", 1) for line in output.splitlines() if "\t" in line)
+            hits = int(stats.get("direct_cache_hit", 0)) + int(stats.get("preprocessed_cache_hit", 0))
+            return hits, int(stats.get("cache_miss", 0))
+        output = subprocess.check_output(
+            [env["COMPILER_LAUNCHER"], "--show-stats", "--stats-format=json"],
+            stderr=subprocess.DEVNULL,
+            env=env["ENV"],
+        ).decode("utf-8")
+        stats = json.loads(output)["stats"]
+        return (
+            sum(stats["cache_hits"]["counts"].values()),
+            sum(stats["cache_misses"]["counts"].values()),
+        )
+    except (subprocess.CalledProcessError, OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def _format_ratio(hits, requests):
+    return "{} hits / {} requests ({:.1f}%)".format(hits, requests, 100.0 * hits / requests if requests else 0.0)
+
+
+def print_cache_stats(env, name, before):
+    # The SCons cache is reported by `show_progress`, across every environment.
+    after = launcher_stats(env, name)
+    if before is None or after is None:
+        print("{}: statistics unavailable".format(name))
+        return
+    hits, misses = after[0] - before[0], after[1] - before[1]
+    print("{}: {}".format(name, _format_ratio(hits, hits + misses)))
@@ -1,6 +1,9 @@
+import os
 from collections import OrderedDict
 from io import TextIOWrapper
 
+from build.generated_file import write_generated_file
+
 
 def get_license_info(src_copyright):
     class LicenseReader:
@@ -80,6 +83,10 @@ def license_builder(target, source, env):
     with open(src_license, "r", encoding="utf-8") as file:
         license_text = file.read()
 
+    compression = env.get("compression")
+    if compression:
+        return _compressed_license_builder(target, env, name_prefix, compression, src_copyright, license_text)
+
     def copyright_data_str() -> str:
         result = ""
         for line in src_copyright["data"]:
@@ -120,10 +127,9 @@ def license_builder(target, source, env):
             )
         return result
 
-    with open(str(target[0]), "wt", encoding="utf-8", newline="\n") as file:
-        file.write("/* THIS FILE IS GENERATED. EDITS WILL BE LOST. */\n\n")
-        file.write(
-            f"""\
+    write_generated_file(
+        str(target[0]),
+        f"""\
 #pragma once
 
 #include <array>
@@ -163,5 +169,174 @@ namespace OpenVic {{
 	static constexpr std::array {licenses_name} = std::to_array<{license_name}>({{
 {license_list_str()}\t}});
 }}
-"""
+""",
+    )
+
+
+LICENSE_COMPRESSIONS = ("deflate", "zstd")
+
+
+def _compress(data: bytes, compression: str) -> bytes:
+    from SCons.Errors import UserError
+
+    if compression == "deflate":
+        import zlib
+
+        # zlib format, what Godot's `PackedByteArray.decompress(size, COMPRESSION_DEFLATE)` reads.
+        return zlib.compress(data, 9)
+    if compression != "zstd":
+        raise UserError(f"Unknown license compression '{compression}', use one of: {', '.join(LICENSE_COMPRESSIONS)}")
+    try:
+        from compression import zstd
+
+        return bytes(zstd.compress(data, level=19))
+    except ImportError:
+        pass
+    try:
+        import zstandard
+    except ImportError:
+        raise UserError("zstd license compression requires Python 3.14 or the `zstandard` package.")
+    return bytes(zstandard.ZstdCompressor(level=19).compress(data))
+
+
+def _compressed_license_builder(target, env, name_prefix, compression, src_copyright, license_text):
+    """Write every string into a single compressed blob, referenced through offset tables.
+
+    The blob is embedded as a byte array, through `#embed` when the compiler supports it and a `.bin` is given as
+    second target. Includers only parse small tables, and the text is decompressed at runtime when needed.
+    """
+    prefix_upper = name_prefix.upper()
+    prefix_capital = name_prefix.capitalize()
+
+    string_name = f"{prefix_capital}LicenseString"
+    license_text_name = f"{prefix_upper}_LICENSE_TEXT"
+    component_copyright_part_name = f"{prefix_capital}ComponentCopyrightPart"
+    component_copyright_name = f"{prefix_capital}ComponentCopyright"
+    copyright_data_name = f"{prefix_upper}_COPYRIGHT_DATA"
+    copyright_parts_name = f"{prefix_upper}_COPYRIGHT_PARTS"
+    copyright_info_name = f"{prefix_upper}_COPYRIGHT_INFO"
+    license_name = f"{prefix_capital}License"
+    licenses_name = f"{prefix_upper}_LICENSES"
+    data_name = f"{prefix_upper}_LICENSE_DATA"
+    embed_macro = f"{prefix_upper}_LICENSE_DATA_EMBED"
+
+    blob = bytearray()
+    offsets = {}
+
+    def string(text: str) -> str:
+        if text not in offsets:
+            encoded = text.encode("utf-8")
+            offsets[text] = (len(blob), len(encoded))
+            blob.extend(encoded)
+        return "{{ {}, {} }}".format(*offsets[text])
+
+    license_text_range = string(license_text)
+    copyright_data = "".join(f"\t\t{string(line)},\n" for line in src_copyright["data"])
+
+    copyright_parts = ""
+    copyright_info = ""
+    part_index = 0
+    for project_name, project in src_copyright["projects"].items():
+        copyright_info += (
+            f"\t\t{{ {string(project_name)}, {{ &{copyright_parts_name}[{part_index}], {len(project)} }} }},\n"
         )
+        for part in project:
+            copyright_parts += (
+                f"\t\t{{ {string(part['License'][0])}, "
+                + f"{{ &{copyright_data_name}[{part['file_index']}], {len(part['Files'])} }}, "
+                + f"{{ &{copyright_data_name}[{part['copyright_index']}], {len(part['Copyright'])} }} }},\n"
+            )
+            part_index += 1
+
+    licenses = ""
+    for license in src_copyright["licenses"]:
+        body = "\n".join(line if line != "." else "" for line in license[1:]) + "\n"
+        licenses += f"\t\t{{ {string(license[0])}, {string(body)} }},\n"
+
+    compressed = _compress(bytes(blob), compression)
+    data_bytes = "".join(
+        "\t\t" + ", ".join(str(b) for b in compressed[i : i + 32]) + ",\n" for i in range(0, len(compressed), 32)
+    )
+
+    header_path = str(target[0])
+    embed = ""
+    if len(target) > 1:
+        bin_path = str(target[1])
+        with open(bin_path, "wb") as file:
+            file.write(compressed)
+        include = os.path.relpath(bin_path, os.path.dirname(header_path)).replace("\\", "/")
+        embed = f"""\
+#ifdef __has_embed
+#if __has_embed("{include}")
+#define {embed_macro}
+#endif
+#endif
+
+"""
+        data_bytes = f"""\
+#ifdef {embed_macro}
+#embed "{include}"
+#undef {embed_macro}
+#else
+{data_bytes}#endif
+"""
+
+    write_generated_file(
+        header_path,
+        f"""\
+#pragma once
+
+#include <array>
+#include <cstddef>
+#include <cstdint>
+#include <span>
+#include <string_view>
+
+{embed}namespace OpenVic {{
+	/* Location of a string in the data decompressed from {data_name}_COMPRESSED. */
+	struct {string_name} {{
+		uint32_t offset;
+		uint32_t size;
+
+		constexpr std::string_view get(char const* decompressed) const {{
+			return {{ decompressed + offset, size }};
+		}}
+	}};
+
+	static constexpr std::string_view {data_name}_COMPRESSION = "{compression}";
+	static constexpr size_t {data_name}_SIZE = {len(blob)};
+	static constexpr uint8_t {data_name}_COMPRESSED[] = {{
+{data_bytes}\t}};
+
+	static constexpr {string_name} {license_text_name} = {license_text_range};
+
+	struct {component_copyright_part_name} {{
+		{string_name} license;
+		std::span<const {string_name}> files;
+		std::span<const {string_name}> copyright_statements;
+	}};
+
+	struct {component_copyright_name} {{
+		{string_name} name;
+		std::span<const {component_copyright_part_name}> parts;
+	}};
+
+	static constexpr std::array {copyright_data_name} = std::to_array<{string_name}>({{
+{copyright_data}\t}});
+
+	static constexpr std::array {copyright_parts_name} = std::to_array<{component_copyright_part_name}>({{
+{copyright_parts}\t}});
+
+	static constexpr std::array {copyright_info_name} = std::to_array<{component_copyright_name}>({{
+{copyright_info}\t}});
+
+	struct {license_name} {{
+		{string_name} license_name;
+		{string_name} license_body;
+	}};
+
+	static constexpr std::array {licenses_name} = std::to_array<{license_name}>({{
+{licenses}\t}});
+}}
+""",
+    )
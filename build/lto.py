@@ -0,0 +1,130 @@
+import os
+
+# link.exe uses at most 8 code generation threads.
+MSVC_MAX_CGTHREADS = 8
+
+
+def lto_jobs(env):
+    """Return the parallelism of LTO links, from `lto_jobs` or the job count of the build."""
+    from SCons.Errors import UserError
+
+    value = str(env.get("lto_jobs", "auto")).strip().lower()
+    if value == "auto":
+        return max(1, env.GetOption("num_jobs"))
+    try:
+        return max(1, int(value))
+    except ValueError:
+        raise UserError("lto_jobs must be 'auto' or a number of jobs, got '{}'".format(value))
+
+
+def cache_policy(size):
+    """Return the LLVM cache pruning policy keeping the cache under `size`, megabytes or a percentage of free space."""
+    size = str(size).strip()
+    if not size:
+        return None
+    if size.endswith("%"):
+        return "cache_size=" + size
+    try:
+        return "cache_size_bytes={}m".format(int(float(size)))
+    except ValueError:
+        from SCons.Errors import UserError
+
+        raise UserError("lto_cache_size must be a size in megabytes or a percentage, got '{}'".format(size))
+
+
+def _unsigned(flags):
+    # Neither the job count nor the cache change what's linked, don't relink when they change.
+    return ["$("] + flags + ["$)"]
+
+
+def _selected_linker(env):
+    return [flag for flag in env.Flatten(env.get("LINKFLAGS", [])) if str(flag).startswith("-fuse-ld=")]
+
+
+def _gnu_lto_flags(env, jobs, cache_dir, policy):
+    """Return the LTO link flags of the first linker flavor the toolchain accepts."""
+    from build.toolchain import linker_supports, using_clang
+
+    if not using_clang(env):
+        # The jobserver is shared with GCC's LTRANS jobs, otherwise use as many as the build.
+        if "MAKEFLAGS" in env["ENV"] and linker_supports(env, ["-flto", "-flto=auto"]):
+            return ["-flto=auto"]
+        return ["-flto={}".format(jobs)]
+
+    thin = env["lto"] == "thin"
+    lto_flag = "-flto=thin" if thin else "-flto"
+    flavors = [
+        # lld, also in MinGW mode.
+        (
+            ["-Wl,--thinlto-jobs={}".format(jobs)] if thin else ["-Wl,--lto-partitions={}".format(jobs)],
+            ["-Wl,--thinlto-cache-dir=" + cache_dir] if cache_dir else [],
+            ["-Wl,--thinlto-cache-policy=" + policy] if cache_dir and policy else [],
+        ),
+        # Apple ld64.
+        (
+            ["-Wl,-mllvm,-threads={}".format(jobs)],
+            ["-Wl,-cache_path_lto," + cache_dir] if cache_dir else [],
+            ["-Wl,-max_relative_cache_size_lto," + policy[len("cache_size=") : -1]]
+            if cache_dir and policy and policy.startswith("cache_size=")
+            else [],
+        ),
+        # The LLVM gold plugin, with gold, bfd and mold.
+        (
+            ["-Wl,-plugin-opt,jobs={}".format(jobs)],
+            ["-Wl,-plugin-opt,cache-dir=" + cache_dir] if cache_dir else [],
+            ["-Wl,-plugin-opt,cache-policy=" + policy] if cache_dir and policy else [],
+        ),
+    ]
+    linker = _selected_linker(env)
+    for jobs_flags, cache_flags, policy_flags in flavors:
+        if linker_supports(env, linker + [lto_flag] + jobs_flags):
+            if cache_flags and not linker_supports(env, linker + [lto_flag] + cache_flags + policy_flags):
+                print("The linker doesn't support a ThinLTO cache, ignoring lto_cache.")
+                return jobs_flags
+            return jobs_flags + cache_flags + policy_flags
+    print("Couldn't find how to run LTO links in parallel with this linker, they use its default.")
+    return []
+
+
+def _msvc_lto_flags(env, jobs, cache_dir, policy):
+    if not env["use_llvm"]:
+        return ["/CGTHREADS:{}".format(min(jobs, MSVC_MAX_CGTHREADS))]
+    if "lld-link" not in os.path.basename(env.subst("$LINK")).lower():
+        print("Couldn't find how to run LTO links in parallel with this linker, they use its default.")
+        return []
+    flags = ["/opt:lldltojobs={}".format(jobs)]
+    if cache_dir and env["lto"] == "thin":
+        flags.append("/lldltocache:" + cache_dir)
+        if policy:
+            flags.append("/lldltocachepolicy:" + policy)
+    return flags
+
+
+def setup_lto_link(env):
+    """Run LTO links with as many jobs as the build, and keep a persistent ThinLTO cache in `lto_cache`.
+
+    The cache lets incremental ThinLTO links only redo the modules that changed. It's pruned by the linker to
+    `lto_cache_size`.
+    """
+    if env["lto"] == "none":
+        return
+
+    jobs = lto_jobs(env)
+    cache_dir = None
+    if env.get("lto_cache") and env["lto"] == "thin":
+        cache_dir = os.path.join(env.Dir("#").abspath, env["lto_cache"])
+    elif env.get("lto_cache") and env["lto"] == "full":
+        print("lto_cache only applies to ThinLTO, ignoring it with lto=full.")
+    policy = cache_policy(env.get("lto_cache_size", ""))
+
+    if env.get("is_msvc", False):
+        flags = _msvc_lto_flags(env, jobs, cache_dir, policy)
+    else:
+        flags = _gnu_lto_flags(env, jobs, cache_dir, policy)
+    if not flags:
+        return
+    env.Append(LINKFLAGS=_unsigned(flags))
+    if cache_dir is not None and any(cache_dir in flag for flag in flags):
+        print("ThinLTO cache enabled... (path: '" + cache_dir + "', jobs: {})".format(jobs))
+    else:
+        print("LTO link jobs: {}".format(jobs))
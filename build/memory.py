@@ -0,0 +1,160 @@
+import atexit
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import threading
+
+from build.response_file import set_spawn
+from build.task_hooks import add_execute_hook, task_kind
+
+MEMORY_PROFILE_FILE = ".scons_memory_profile"
+
+# Estimates for nodes that have no measurement from a previous build yet.
+DEFAULT_COMPILE_MEMORY = 512 * 1024 * 1024
+DEFAULT_LINK_MEMORY = 2 * 1024 * 1024 * 1024
+
+# Share of the available memory `max_memory=auto` budgets for the build.
+AUTO_MEMORY_FRACTION = 0.9
+
+_measurement = threading.local()
+
+
+def available_memory():
+    """Return `MemAvailable` from /proc/meminfo in bytes, or `None` if it can't be read."""
+    try:
+        with open("/proc/meminfo", "r", encoding="utf-8") as file:
+            for line in file:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def parse_max_memory(value):
+    """Return the memory budget in bytes for a `max_memory` value ("none", "auto" or megabytes)."""
+    value = str(value).strip().lower()
+    if value in ("", "none", "0"):
+        return None
+    if value == "auto":
+        available = available_memory()
+        if available is None:
+            print("Couldn't read available memory from /proc/meminfo, specify max_memory in megabytes.")
+            return None
+        return int(available * AUTO_MEMORY_FRACTION)
+    try:
+        return int(float(value) * 1024 * 1024)
+    except ValueError:
+        from SCons.Errors import UserError
+
+        raise UserError("max_memory must be 'none', 'auto' or a size in megabytes, got '{}'".format(value))
+
+
+def measuring_spawn(sh, escape, cmd, args, env):
+    """POSIX spawn that records the peak RSS of each command for the task running on this thread."""
+    proc = subprocess.Popen([sh, "-c", " ".join(args)], env=env, close_fds=True)
+    _pid, status, rusage = os.wait4(proc.pid, 0)
+    # Let Popen know the process is gone so it won't try to reap it again.
+    # `os.waitstatus_to_exitcode` needs Python 3.9.
+    proc.returncode = -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+    peak = rusage.ru_maxrss if sys.platform == "darwin" else rusage.ru_maxrss * 1024
+    _measurement.peak = max(getattr(_measurement, "peak", 0), peak)
+    return proc.returncode
+
+
+class MemoryScheduler:
+    """Throttle job starts so the estimated peak memory of the running jobs stays under `budget`.
+
+    Estimates come from the peak RSS measured for each node in the previous build. Links are also limited to
+    `link_jobs` at a time.
+    """
+
+    def __init__(self, profile_path, budget, link_jobs):
+        self.profile_path = profile_path
+        self.budget = budget
+        self.link_slots = threading.BoundedSemaphore(link_jobs)
+        self.condition = threading.Condition()
+        self.in_use = 0
+        self.running = 0
+        self.profile = {}
+        self.dirty = False
+        try:
+            with open(profile_path, "r", encoding="utf-8") as file:
+                self.profile = json.load(file)
+        except (OSError, ValueError):
+            pass
+
+    def estimate(self, name, kind):
+        if name in self.profile:
+            return self.profile[name]
+        return DEFAULT_LINK_MEMORY if kind == "link" else DEFAULT_COMPILE_MEMORY
+
+    def reserve(self, amount):
+        # A single job is always allowed, even if it's estimated over the whole budget.
+        amount = min(amount, self.budget)
+        with self.condition:
+            while self.running > 0 and self.in_use + amount > self.budget:
+                self.condition.wait()
+            self.in_use += amount
+            self.running += 1
+        return amount
+
+    def free(self, amount):
+        with self.condition:
+            self.in_use -= amount
+            self.running -= 1
+            self.condition.notify_all()
+
+    def record(self, name, peak):
+        with self.condition:
+            self.profile[name] = peak
+            self.dirty = True
+
+    @contextlib.contextmanager
+    def schedule(self, task):
+        name = str(task.targets[0])
+        kind = task_kind(task)
+        with contextlib.ExitStack() as stack:
+            if kind == "link":
+                stack.enter_context(self.link_slots)
+            reserved = self.reserve(self.estimate(name, kind))
+            stack.callback(self.free, reserved)
+            _measurement.peak = 0
+            yield
+            if _measurement.peak:
+                self.record(name, _measurement.peak)
+
+    def save(self):
+        if not self.dirty:
+            return
+        try:
+            with open(self.profile_path + ".tmp", "w", encoding="utf-8") as file:
+                json.dump(self.profile, file, separators=(",", ":"), sort_keys=True)
+            os.replace(self.profile_path + ".tmp", self.profile_path)
+        except OSError:
+            pass
+
+
+def setup_memory_scheduler(env, max_memory, link_jobs):
+    """Limit concurrent jobs by their estimated memory use and concurrent links to `link_jobs` (0 picks it)."""
+    budget = parse_max_memory(max_memory)
+    if budget is None:
+        return
+    if not hasattr(os, "wait4"):
+        print("Memory-aware scheduling requires a POSIX host, ignoring max_memory.")
+        return
+
+    if link_jobs <= 0:
+        link_jobs = max(1, env.GetOption("num_jobs") // 4)
+    scheduler = MemoryScheduler(os.path.join(env.Dir("#").abspath, MEMORY_PROFILE_FILE), budget, link_jobs)
+    set_spawn(env, measuring_spawn)
+    # Wait for memory before taking a jobserver token, so waiting jobs don't starve other processes.
+    add_execute_hook(scheduler.schedule, priority=-200)
+    atexit.register(scheduler.save)
+    print(
+        "Memory-aware scheduling enabled... (budget: {} MB, concurrent links: {})".format(
+            budget // (1024 * 1024), link_jobs
+        )
+    )
@@ -0,0 +1,29 @@
+CXX_SUFFIXES = [".cpp", ".cc", ".cxx", ".c++", ".C++", ".C"]
+C_SUFFIXES = [".c"]
+
+
+def add_object_emitter(env, emitter, suffixes=None):
+    """Chain `emitter` after the default emitters of the object builders.
+
+    Builders are shared between cloned environments, so `emitter` must check the
+    environment it is called with before acting. Registering the same emitter twice is a no-op.
+    """
+    from SCons.Builder import ListEmitter
+
+    if suffixes is None:
+        suffixes = CXX_SUFFIXES
+
+    for builder_name in ("StaticObject", "SharedObject"):
+        builder = env["BUILDERS"].get(builder_name)
+        if builder is None:
+            continue
+        for suffix in suffixes:
+            existing = builder.emitter.get(suffix)
+            if existing is None:
+                continue
+            if isinstance(existing, ListEmitter):
+                if emitter in existing:
+                    continue
+                builder.add_emitter(suffix, ListEmitter(list(existing) + [emitter]))
+            else:
+                builder.add_emitter(suffix, ListEmitter([existing, emitter]))
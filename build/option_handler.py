@@ -1,14 +1,26 @@
+import atexit
+import hashlib
+import json
 import os
 
 from SCons.Variables import Variables
 
+OPTIONS_CACHE_FILE = ".scons_options_cache"
+# Finalized option sets kept, the least recently used ones are dropped.
+OPTIONS_CACHE_SIZE = 16
+# Values that round-trip through the JSON cache unchanged.
+_CACHEABLE_TYPES = (str, bool, int, float, type(None))
+
 
 class OptionsClass:
-    def __init__(self, args):
+    def __init__(self, args, cache_path=None):
         self.opts = None
         self.opt_list = []
         self.args = args
         self.saved_args = args.copy()
+        self.cache_path = cache_path
+        self._cache = None
+        self._cache_dirty = False
 
     def Add(self, variableOrKey, *argv, **kwarg):
         self.opt_list.append([variableOrKey, argv, kwarg])
@@ -33,8 +45,67 @@ class OptionsClass:
             else:
                 self.opts.Add(opt[0], *opt[1], **opt[2])
 
-    def Finalize(self, env):
-        self.opts.Update(env)
+    def Finalize(self, env, overrides=None):
+        # Overrides take precedence over the command line, for the environments of variants.
+        args = dict(self.args, **overrides) if overrides else self.args
+        if self.cache_path is None:
+            self.opts.Update(env, args)
+            return
+
+        # The custom files and profile are only read, and the options converted and validated, when they changed.
+        key = self._cache_key(args)
+        cache = self._get_cache()
+        values = cache.get(key)
+        if values is not None:
+            env.Replace(**values)
+            if key == next(reversed(cache)):
+                return
+            del cache[key]
+        else:
+            self.opts.Update(env, args)
+            values = {opt.key: env[opt.key] for opt in self.opts.options if opt.key in env}
+            if not all(isinstance(value, _CACHEABLE_TYPES) for value in values.values()):
+                return
+        # Inserted last, the least recently used entries come first.
+        cache[key] = values
+        while len(cache) > OPTIONS_CACHE_SIZE:
+            del cache[next(iter(cache))]
+        self._cache_dirty = True
 
     def GenerateHelpText(self, env):
         return self.opts.GenerateHelpText(env)
+
+    def _cache_key(self, args):
+        files = []
+        for path in self.opts.files:
+            try:
+                st = os.stat(path)
+                files.append([os.path.abspath(path), st.st_size, st.st_mtime_ns])
+            except OSError:
+                files.append([os.path.abspath(path), None, None])
+        key = {
+            "args": sorted((str(k), str(v)) for k, v in args.items()),
+            "options": [[opt.key, opt.help, repr(opt.default)] for opt in self.opts.options],
+            "files": files,
+        }
+        return hashlib.sha1(json.dumps(key).encode("utf-8")).hexdigest()
+
+    def _get_cache(self):
+        if self._cache is None:
+            try:
+                with open(self.cache_path, "r", encoding="utf-8") as file:
+                    self._cache = json.load(file)
+            except (OSError, ValueError):
+                self._cache = {}
+            atexit.register(self._save_cache)
+        return self._cache
+
+    def _save_cache(self):
+        if not self._cache_dirty:
+            return
+        try:
+            with open(self.cache_path + ".tmp", "w", encoding="utf-8") as file:
+                json.dump(self._cache, file, indent=1)
+            os.replace(self.cache_path + ".tmp", self.cache_path)
+        except OSError:
+            pass
@@ -1,3 +1,8 @@
+import os
+
+from build.object_emitter import add_object_emitter
+
+
 def setup_pch(env, header_rel, source_cpp_variant):
     if not env.get("use_pch", True):
         return
@@ -6,6 +11,8 @@ def setup_pch(env, header_rel, source_cpp_variant):
     if handler is None:
         return
 
+    # Lets environments derived later, like CPU level variants, set up their own precompiled header.
+    env["PCH_SETUP"] = (header_rel, source_cpp_variant)
     name = handler(env, header_rel, source_cpp_variant)
     print(f"[PCH] enabled ({name}): {header_rel}")
 
@@ -13,13 +20,98 @@ def setup_pch(env, header_rel, source_cpp_variant):
 def _select_handler(env):
     if env.get("is_msvc", False):
         return _msvc_pch
-    # TODO: GCC/Clang/MinGW
-    return None
+    return _gnu_pch
 
 
 def _msvc_pch(env, header_rel, source_cpp_variant):
     env["PCHSTOP"] = header_rel
-    pch_pch, _pch_obj = env.PCH(source_cpp_variant)
+    if env.get("PCH_SUBDIR"):
+        source = env.File(source_cpp_variant)
+        target = source.dir.Dir(env["PCH_SUBDIR"]).File(os.path.splitext(source.name)[0] + ".pch")
+        pch_pch, _pch_obj = env.PCH(target, source)
+    else:
+        pch_pch, _pch_obj = env.PCH(source_cpp_variant)
     env["PCH"] = pch_pch
-    env.Append(CCFLAGS=["/FI" + header_rel])
+    env.AppendUnique(CCFLAGS=["/FI" + header_rel])
     return "msvc"
+
+
+def _gnu_pch(env, header_rel, source_cpp_variant):
+    from build.toolchain import using_clang
+
+    is_clang = using_clang(env)
+
+    header = env.FindFile(header_rel, env.get("CPPPATH", [])) or env.File(header_rel)
+    variant_dir = env.File(source_cpp_variant).dir
+
+    # The header is compiled with exactly the flags of the objects that consume it, so any flag change
+    # rebuilds it through the command signature and the C scanner tracks its transitive includes. Static and
+    # shared objects don't share flags (-fPIC...), each kind gets its own precompiled header, built when first used.
+    env["GCHCOM"] = "$CXX -o $TARGET -x c++-header -c $CXXFLAGS $CCFLAGS $_CCCOMCOM $GCHEXTRAFLAGS $SOURCE"
+    env["SHGCHCOM"] = "$SHCXX -o $TARGET -x c++-header -c $SHCXXFLAGS $SHCCFLAGS $_CCCOMCOM $GCHEXTRAFLAGS $SOURCE"
+    # Don't embed the header mtime, otherwise a PCH retrieved from CacheDir is rejected as out of date.
+    env["GCHEXTRAFLAGS"] = ["-Xclang", "-fno-pch-timestamp"] if is_clang else []
+    env["GCHSUFFIX"] = ".pch" if is_clang else ".gch"
+    env["GCHHEADER"] = header
+    env["GCHDIR"] = variant_dir.Dir(env["PCH_SUBDIR"]) if env.get("PCH_SUBDIR") else variant_dir
+    env["GCHNODES"] = {}
+    env["PCHINCLUDEFLAGS"] = _pch_include_flags
+    env.AppendUnique(CXXFLAGS=["$PCHINCLUDEFLAGS"])
+
+    env["GCHVARIANTDIR"] = variant_dir.abspath
+    add_object_emitter(env, _gch_emitter)
+    return "clang" if is_clang else "gcc"
+
+
+def _gch_kind(target):
+    # Set by the default emitters of the object builders.
+    return "shared" if target and getattr(target[0].attributes, "shared", None) else "static"
+
+
+def _gch_wrapper(env, kind):
+    return env["GCHDIR"].Dir(kind).File(env["GCHHEADER"].name)
+
+
+def _pch_include_flags(target, source, env, for_signature):
+    if not target or "GCHDIR" not in env:
+        return []
+    wrapper = _gch_wrapper(env, _gch_kind(target))
+    if env["GCHSUFFIX"] == ".pch":
+        return ["-include-pch", wrapper.path + ".pch"]
+    # GCC looks for `<header>.gch` next to the included path before the header itself.
+    return ["-include", wrapper.path, "-Winvalid-pch"]
+
+
+def _write_wrapper(target, source, env):
+    from build.generated_file import write_generated_file
+
+    include = os.path.relpath(source[0].srcnode().abspath, os.path.dirname(target[0].abspath))
+    write_generated_file(target[0].abspath, '#include "{}"\n'.format(include.replace(os.sep, "/")))
+
+
+def _gch_node(env, kind):
+    """Return the precompiled header of `kind` ("static" or "shared") objects, declaring it on first use."""
+    from SCons.Action import Action
+
+    nodes = env["GCHNODES"]
+    if kind not in nodes:
+        # Compiled through a header including the real one, `#pragma once` warns in the main file.
+        wrapper = _gch_wrapper(env, kind)
+        env.Command(wrapper, env["GCHHEADER"], Action(_write_wrapper, None))
+        env.Precious(wrapper)
+        command = "SHGCHCOM" if kind == "shared" else "GCHCOM"
+        pch = env.File(wrapper.path + env["GCHSUFFIX"])
+        env.Command(pch, wrapper, Action("$" + command, "$" + command + "STR"), PCHINCLUDEFLAGS=[])
+        nodes[kind] = pch
+    return nodes[kind]
+
+
+def _gch_emitter(target, source, env):
+    if "GCHDIR" not in env:
+        return target, source
+
+    variant_dir = env["GCHVARIANTDIR"].replace("\\", "/").rstrip("/") + "/"
+    for t in target:
+        if t.abspath.replace("\\", "/").startswith(variant_dir):
+            env.Depends(t, _gch_node(env, _gch_kind([t])))
+    return target, source
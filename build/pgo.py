@@ -0,0 +1,141 @@
+import atexit
+import hashlib
+import os
+from typing import List
+
+from build.object_emitter import C_SUFFIXES, CXX_SUFFIXES, add_object_emitter
+
+_stale_sources: List[str] = []
+
+
+def _pgo_emitter(target, source, env):
+    profile = env.get("PGO_PROFILE")
+    if profile is None:
+        return target, source
+
+    for t in target:
+        env.Depends(t, profile)
+    profile_time = env.get("PGO_PROFILE_TIME")
+    for s in source:
+        try:
+            if profile_time is not None and os.path.getmtime(s.srcnode().abspath) > profile_time:
+                _stale_sources.append(str(s))
+        except OSError:
+            pass
+    return target, source
+
+
+def _report_stale_sources():
+    if not _stale_sources:
+        return
+    print(
+        "Warning: {} source files changed since the PGO profile was collected, "
+        "regenerate it with `pgo=generate`:".format(len(_stale_sources))
+    )
+    for name in _stale_sources[:5]:
+        print("    " + name)
+    if len(_stale_sources) > 5:
+        print("    ...")
+
+
+def _find_profdata_tool(env):
+    from build.toolchain import probe_compiler
+
+    compiler = probe_compiler(env)
+    if compiler["id"] == "apple-clang":
+        return "xcrun llvm-profdata" if env.WhereIs("xcrun") else None
+    names = ["llvm-profdata"]
+    if compiler["version"]:
+        names.insert(0, "llvm-profdata-{}".format(compiler["version"][0]))
+    return next((path for path in (env.WhereIs(name) for name in names) if path), None)
+
+
+def _gcc_profile(env, profile_dir):
+    """Return a node summarizing the .gcda files, and the time of the newest one."""
+    digest = hashlib.md5()
+    newest = None
+    for entry in sorted(os.scandir(profile_dir), key=lambda e: e.name):
+        if not entry.name.endswith(".gcda"):
+            continue
+        st = entry.stat()
+        digest.update("{}:{}:{}\n".format(entry.name, st.st_size, st.st_mtime_ns).encode("utf-8"))
+        newest = st.st_mtime if newest is None else max(newest, st.st_mtime)
+    if newest is None:
+        return None, None
+    return env.Value(digest.hexdigest()), newest
+
+
+def _clang_profile(env, profile_dir):
+    """Return the .profdata node, merged from the .profraw files if there are any, and its collection time."""
+    from SCons.Action import Action
+
+    profdata = os.path.join(profile_dir, "default.profdata")
+    profraws = sorted(
+        entry.path for entry in os.scandir(profile_dir) if entry.name.endswith(".profraw") and entry.is_file()
+    )
+    if profraws:
+        tool = _find_profdata_tool(env)
+        if tool is None:
+            print("llvm-profdata not found, can't merge the .profraw files in '" + profile_dir + "'.")
+            env.Exit(255)
+        env.Command(
+            profdata,
+            profraws,
+            Action(tool + " merge -output=$TARGET $SOURCES", "Merging PGO profile ==> $TARGET"),
+        )
+        return env.File(profdata), max(os.path.getmtime(path) for path in profraws)
+    if os.path.isfile(profdata):
+        return env.File(profdata), os.path.getmtime(profdata)
+    return None, None
+
+
+def setup_pgo(env):
+    """Instrument the build with `pgo=generate`, or optimize it with the profiles in `pgo_dir` with `pgo=use`."""
+    from build.toolchain import supports_flag, using_clang
+
+    profile_dir = os.path.join(env.Dir("#").abspath, env["pgo_dir"])
+    clang = using_clang(env)
+
+    if env["pgo"] == "generate":
+        os.makedirs(profile_dir, exist_ok=True)
+        if clang:
+            # %m merges the profiles of every run of the same binary into a single file.
+            flags = ["-fprofile-instr-generate=" + os.path.join(profile_dir, "%m.profraw")]
+        else:
+            # The simulation is multithreaded, keep the counters consistent.
+            flags = ["-fprofile-generate=" + profile_dir, "-fprofile-update=atomic"]
+        env.Append(CCFLAGS=flags)
+        env.Append(LINKFLAGS=flags)
+        print("PGO instrumentation enabled... (path: '" + profile_dir + "')")
+        return
+
+    if not os.path.isdir(profile_dir):
+        print("PGO profile directory '" + profile_dir + "' not found, build with `pgo=generate` and run it first.")
+        env.Exit(255)
+
+    if clang:
+        profile, profile_time = _clang_profile(env, profile_dir)
+        if profile is not None:
+            env.Append(CCFLAGS=["-fprofile-instr-use=" + profile.abspath, "-Wprofile-instr-out-of-date"])
+            env.Append(LINKFLAGS=["-fprofile-instr-use=" + profile.abspath])
+            if supports_flag(env, "-Wprofile-instr-unprofiled"):
+                env.Append(CCFLAGS=["-Wprofile-instr-unprofiled"])
+    else:
+        profile, profile_time = _gcc_profile(env, profile_dir)
+        if profile is not None:
+            # Threads make counters slightly inconsistent, and edited sources must not fail the build.
+            flags = ["-fprofile-use=" + profile_dir, "-fprofile-correction"]
+            env.Append(CCFLAGS=flags + ["-Wcoverage-mismatch", "-Wno-error=coverage-mismatch"])
+            env.Append(LINKFLAGS=flags)
+            if supports_flag(env, "-Wmissing-profile"):
+                env.Append(CCFLAGS=["-Wmissing-profile"])
+
+    if profile is None:
+        print("No PGO profile found in '" + profile_dir + "', build with `pgo=generate` and run it first.")
+        env.Exit(255)
+
+    env["PGO_PROFILE"] = profile
+    env["PGO_PROFILE_TIME"] = profile_time
+    add_object_emitter(env, _pgo_emitter, CXX_SUFFIXES + C_SUFFIXES)
+    atexit.register(_report_stale_sources)
+    print("PGO optimization enabled... (path: '" + profile_dir + "')")
@@ -0,0 +1,62 @@
+import os
+
+from SCons.Variables import BoolVariable, EnumVariable
+
+# Options of the platform tools, declared here so registering them doesn't import the tools, and the SCons tools
+# they load (mingw, msvc, clang...), of platforms that aren't built.
+
+
+def linux_options(opts):
+    opts.Add(BoolVariable("use_llvm", "Use the LLVM compiler - only effective when targeting Linux", False))
+    opts.Add(
+        EnumVariable(
+            "linker",
+            "Linker to use - only effective when targeting Linux, auto picks the fastest available one",
+            "auto",
+            ("auto", "bfd", "gold", "lld", "mold"),
+        )
+    )
+    opts.Add(BoolVariable("use_static_cpp", "Link libgcc and libstdc++ statically for better portability", True))
+    opts.Add(BoolVariable("use_ubsan", "Use LLVM/GCC compiler undefined behavior sanitizer (UBSAN)", False))
+    opts.Add(BoolVariable("use_asan", "Use LLVM/GCC compiler address sanitizer (ASAN)", False))
+    opts.Add(BoolVariable("use_lsan", "Use LLVM/GCC compiler leak sanitizer (LSAN)", False))
+    opts.Add(BoolVariable("use_tsan", "Use LLVM/GCC compiler thread sanitizer (TSAN)", False))
+    opts.Add(BoolVariable("use_msan", "Use LLVM compiler memory sanitizer (MSAN)", False))
+
+
+def macos_options(opts):
+    opts.Add("macos_deployment_target", "macOS deployment target", "default")
+    opts.Add("macos_sdk_path", "macOS SDK path", "")
+    if "OSXCROSS_ROOT" in os.environ:
+        opts.Add("osxcross_sdk", "OSXCross SDK version", "darwin16")
+    opts.Add(BoolVariable("use_ubsan", "Use LLVM/GCC compiler undefined behavior sanitizer (UBSAN)", False))
+    opts.Add(BoolVariable("use_asan", "Use LLVM/GCC compiler address sanitizer (ASAN)", False))
+    opts.Add(BoolVariable("use_tsan", "Use LLVM/GCC compiler thread sanitizer (TSAN)", False))
+
+
+def windows_options(opts):
+    mingw = os.getenv("MINGW_PREFIX", "")
+
+    opts.Add(BoolVariable("use_mingw", "Use the MinGW compiler instead of MSVC - only effective on Windows", False))
+    opts.Add(BoolVariable("use_static_cpp", "Link MinGW/MSVC C++ runtime libraries statically", False))
+    opts.Add(BoolVariable("silence_msvc", "Silence MSVC's cl/link stdout bloat, redirecting errors to stderr.", True))
+    opts.Add(BoolVariable("debug_crt", "Compile with MSVC's debug CRT (/MDd)", False))
+    opts.Add(BoolVariable("use_llvm", "Use the LLVM compiler (MVSC or MinGW depending on the use_mingw flag)", False))
+    opts.Add("mingw_prefix", "MinGW prefix", mingw)
+    opts.Add(BoolVariable("use_asan", "Use address sanitizer (ASAN)", False))
+
+
+PLATFORM_OPTIONS = {
+    "linux": linux_options,
+    "macos": macos_options,
+    "windows": windows_options,
+}
+
+
+def add_platform_options(opts, platforms, current_platform):
+    """Add the options of every platform of `platforms`, `current_platform` last so its defaults win."""
+    if current_platform in platforms:
+        platforms = [pl for pl in platforms if pl != current_platform] + [current_platform]
+    for pl in platforms:
+        if pl in PLATFORM_OPTIONS:
+            PLATFORM_OPTIONS[pl](opts)
@@ -0,0 +1,100 @@
+import os
+import re
+import subprocess
+import tempfile
+
+# CreateProcess is limited to 32767 characters. POSIX spawns pass the whole command line to `sh -c` as a single
+# argument, which Linux limits to MAX_ARG_STRLEN (128 KiB).
+RESPONSE_FILE_THRESHOLD = 32000 if os.name == "nt" else 128000
+
+# Compiler drivers, archivers and linkers that expand `@file` arguments, optionally with a target prefix
+# (`x86_64-w64-mingw32-g++`) or a version suffix (`clang-18`).
+_RESPONSE_FILE_TOOL = re.compile(
+    r"(?:^|-)(?:gcc|g\+\+|cc|c\+\+|clang|clang\+\+|clang-cl|ar|gcc-ar|llvm-ar|ld|ld\.\w+|lld|cl|link|lib)"
+    r"(?:-[\d.]+)?(?:\.exe)?$",
+    re.IGNORECASE,
+)
+_MSVC_TOOLS = ("cl", "cl.exe", "clang-cl", "clang-cl.exe", "link", "link.exe", "lib", "lib.exe")
+_LAUNCHERS = ("ccache", "ccache.exe", "sccache", "sccache.exe")
+_REDIRECT = re.compile(r"^[12]?>")
+
+
+def _tool_name(arg):
+    return os.path.basename(arg.strip("\"'")).lower()
+
+
+def _tool_index(args):
+    """Return the index of the tool reading the response file in `args`, skipping a compiler launcher."""
+    index = 1 if len(args) > 1 and _tool_name(args[0]) in _LAUNCHERS else 0
+    return index if _RESPONSE_FILE_TOOL.search(_tool_name(args[index])) else None
+
+
+def _response_file_arg(arg, msvc):
+    # POSIX arguments are already escaped for `sh`, whose quoting GNU tools also parse in response files. On Windows
+    # they're only quoted, GNU tools would take the backslashes of paths as escapes.
+    if os.name == "nt" and not msvc:
+        return arg.replace("\\", "\\\\")
+    return arg
+
+
+def response_file_spawn(spawn, threshold=RESPONSE_FILE_THRESHOLD):
+    """Wrap `spawn` to pass the arguments of command lines over `threshold` characters in a response file."""
+
+    def spawn_with_response_file(sh, escape, cmd, args, env):
+        if sum(len(arg) + 1 for arg in args) <= threshold:
+            return spawn(sh, escape, cmd, args, env)
+        index = _tool_index(args)
+        if index is None:
+            return spawn(sh, escape, cmd, args, env)
+
+        msvc = _tool_name(args[index]) in _MSVC_TOOLS
+        # Output redirections are for the shell, keep them on the command line.
+        arguments = [arg for arg in args[index + 1 :] if not _REDIRECT.match(arg)]
+        redirections = [arg for arg in args[index + 1 :] if _REDIRECT.match(arg)]
+        fd, path = tempfile.mkstemp(suffix=".rsp", text=True)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as file:
+                file.write("\n".join(_response_file_arg(arg, msvc) for arg in arguments) + "\n")
+            return spawn(sh, escape, cmd, args[: index + 1] + [escape("@" + path)] + redirections, env)
+        finally:
+            os.remove(path)
+
+    return spawn_with_response_file
+
+
+def windows_spawn(sh, escape, cmd, args, env):
+    """Run the command directly instead of through `cmd.exe`, which limits command lines to 8191 characters."""
+    startupinfo = subprocess.STARTUPINFO()
+    startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+    proc = subprocess.Popen(
+        " ".join(args),
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        startupinfo=startupinfo,
+        shell=False,
+        env=env,
+    )
+    _data, err = proc.communicate()
+    rv = proc.wait()
+    if rv:
+        print("=====")
+        print(err.decode("utf-8"))
+        print("=====")
+    return rv
+
+
+def setup_response_files(env, threshold=RESPONSE_FILE_THRESHOLD):
+    """Pass long command lines to compilers, archivers and linkers in response files.
+
+    Arguments of command lines over `threshold` characters go through an `@file`, so even huge archives are created
+    by a single `ar` invocation.
+    """
+    env["RESPONSE_FILE_THRESHOLD"] = threshold
+    set_spawn(env, windows_spawn if os.name == "nt" else env["SPAWN"])
+
+
+def set_spawn(env, spawn):
+    """Run commands with `spawn`, keeping response files if they're enabled."""
+    threshold = env.get("RESPONSE_FILE_THRESHOLD")
+    env["SPAWN"] = spawn if threshold is None else response_file_spawn(spawn, threshold)
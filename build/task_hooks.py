@@ -0,0 +1,108 @@
+import contextlib
+import threading
+from typing import Any, Callable, Dict, List, Tuple
+
+_hooks: List[Tuple[int, Callable[..., Any]]] = []
+_executed_hooks: List[Callable[..., Any]] = []
+_slots: Dict[int, int] = {}
+_slots_lock = threading.Lock()
+
+COMPILE_BUILDERS = ("Object", "StaticObject", "SharedObject", "PCH")
+LINK_BUILDERS = ("Program", "SharedLibrary", "LoadableModule")
+ARCHIVE_BUILDERS = ("Library", "StaticLibrary")
+
+
+def add_execute_hook(hook, priority=0):
+    """Wrap the execution of every build task in the context manager returned by `hook(task)`.
+
+    Hooks with a lower priority wrap the ones with a higher priority.
+    """
+    if not _hooks:
+        _install()
+    _hooks.append((priority, hook))
+    _hooks.sort(key=lambda h: h[0])
+
+
+def _install():
+    from SCons.Script.Main import BuildTask
+
+    original_execute = BuildTask.execute
+
+    def execute(self):
+        with contextlib.ExitStack() as stack:
+            for _priority, hook in list(_hooks):
+                stack.enter_context(hook(self))
+            return original_execute(self)
+
+    BuildTask.execute = execute
+
+
+def add_executed_hook(hook):
+    """Call `hook(task)` once a build task executed successfully, before its targets are marked as built.
+
+    Unlike execute hooks, these don't run concurrently with the taskmaster, so they may change the dependency graph.
+    """
+    if not _executed_hooks:
+        from SCons.Script.Main import BuildTask
+
+        original_executed = BuildTask.executed
+
+        def executed(self):
+            for hook in _executed_hooks:
+                hook(self)
+            return original_executed(self)
+
+        BuildTask.executed = executed
+    _executed_hooks.append(hook)
+
+
+def task_kind(task):
+    """Classify a task as "compile", "link", "archive" or "other" from the builder of its first target."""
+    node = task.targets[0]
+    builder = node.get_builder()
+    if builder is None:
+        return "other"
+    name = builder.get_name(node.get_build_env())
+    if name in COMPILE_BUILDERS:
+        return "compile"
+    if name in LINK_BUILDERS:
+        return "link"
+    if name in ARCHIVE_BUILDERS:
+        return "archive"
+    return "other"
+
+
+def spawns_process(task):
+    """Return whether executing a task runs a command, as opposed to only Python functions, or nothing for aliases."""
+    from SCons.Action import CommandAction, CommandGeneratorAction, LazyAction, ListAction
+
+    node = task.targets[0]
+    if not node.has_builder():
+        return False
+    executor = node.get_executor()
+    env = executor.get_build_env()
+    targets, sources = executor.get_all_targets(), executor.get_all_sources()
+
+    def spawns(action):
+        if isinstance(action, LazyAction) and action.get_parent_class(env) is CommandAction:
+            return True
+        if isinstance(action, CommandGeneratorAction):
+            return spawns(action._generate(targets, sources, env, 1, executor))
+        if isinstance(action, ListAction):
+            return any(spawns(a) for a in action.list)
+        return isinstance(action, CommandAction)
+
+    try:
+        return any(spawns(action) for action in executor.get_action_list())
+    except Exception:
+        # Whatever a generator needs may only be there at build time, assume it runs a command.
+        return True
+
+
+def job_slot():
+    """Return a stable, zero-based index for the calling job thread."""
+    ident = threading.get_ident()
+    with _slots_lock:
+        if ident not in _slots:
+            _slots[ident] = len(_slots)
+        return _slots[ident]
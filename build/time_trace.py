@@ -0,0 +1,244 @@
+import atexit
+import json
+import os
+import re
+import sys
+from typing import Dict, Optional, Tuple
+
+from build.object_emitter import C_SUFFIXES, CXX_SUFFIXES, add_object_emitter
+
+TIME_REPORT_SUFFIX = ".time-report.txt"
+
+# Clang trace events aggregated by their `detail`.
+_TEMPLATE_EVENTS = ("InstantiateClass", "InstantiateFunction")
+_CODEGEN_EVENTS = ("CodeGen Function", "OptFunction")
+# ` phase parsing   :   0.23 ( 74%)   0.14 ( 82%)   0.37 ( 74%)    25M ( 76%)`, the TOTAL line has no percentages.
+_TIME_REPORT_LINE = re.compile(r"^\s*(.+?)\s*:\s*([\d.]+)\s*(?:\(\s*\d+%\))?\s*([\d.]+)\s*(?:\(\s*\d+%\))?\s*([\d.]+)")
+
+# Trace file of each object, with the compiler that writes it and the object.
+_traces: Dict[str, Tuple[str, str]] = {}
+_report: Optional[str] = None
+
+
+def _time_trace_emitter(target, source, env):
+    kind = env.get("TIME_TRACE")
+    if kind:
+        for t in target:
+            if kind == "clang":
+                # Clang names it after the object, with its extension replaced.
+                path = os.path.splitext(t.abspath)[0] + ".json"
+            else:
+                path = t.abspath + TIME_REPORT_SUFFIX
+            _traces[path] = (kind, t.path)
+            env.Clean(t, path)
+    return target, source
+
+
+def _output_path(args):
+    for i, arg in enumerate(args[:-1]):
+        if arg == "-o":
+            return os.path.abspath(args[i + 1].strip("\"'"))
+    return None
+
+
+def time_report_spawn(spawn):
+    """Wrap `spawn` to write the `-ftime-report` of GCC compiles next to their object instead of stderr.
+
+    Whatever else the compiler printed, like warnings, is still printed.
+    """
+
+    def spawn_with_time_report(sh, escape, cmd, args, env):
+        output = _output_path(args) if "-ftime-report" in args else None
+        if output is None:
+            return spawn(sh, escape, cmd, args, env)
+        path = output + TIME_REPORT_SUFFIX
+        result = spawn(sh, escape, cmd, args + ["2>" + escape(path)], env)
+        try:
+            with open(path, "r", encoding="utf-8", errors="replace") as file:
+                lines = file.read().splitlines(True)
+        except OSError:
+            return result
+        output, report = [], False
+        for line in lines:
+            if line.startswith("Time variable"):
+                report = True
+            if not report:
+                output.append(line)
+            elif line.lstrip().startswith("TOTAL"):
+                report = False
+        # The report is preceded by an empty line.
+        text = "".join(output).rstrip()
+        if text:
+            sys.stderr.write(text + "\n")
+        return result
+
+    return spawn_with_time_report
+
+
+def parse_time_report(content):
+    """Return the wall time in seconds of each timer of a GCC `-ftime-report`."""
+    timers = {}
+    report = False
+    for line in content.splitlines():
+        if line.startswith("Time variable"):
+            report = True
+            continue
+        match = _TIME_REPORT_LINE.match(line) if report else None
+        if match is not None:
+            name = match.group(1).lstrip("|")
+            timers[name] = timers.get(name, 0.0) + float(match.group(4))
+    return timers
+
+
+def _add(table, key, seconds, unit):
+    entry = table.setdefault(key, [0.0, 0, set()])
+    entry[0] += seconds
+    entry[1] += 1
+    entry[2].add(unit)
+
+
+def aggregate_traces(traces):
+    """Aggregate the trace files of `traces` (path to compiler and object) into a report.
+
+    Headers are ranked by their inclusive parse time summed over every translation unit including them, that is
+    their average parse time times their include count.
+    """
+    headers, templates, codegen, phases, units = {}, {}, {}, {}, {}
+    for path, (kind, unit) in sorted(traces.items()):
+        try:
+            with open(path, "r", encoding="utf-8", errors="replace") as file:
+                content = file.read()
+        except OSError:
+            continue
+        if kind != "clang":
+            timers = parse_time_report(content)
+            for name, seconds in timers.items():
+                if name != "TOTAL":
+                    _add(phases, name, seconds, unit)
+            units[unit] = timers.get("TOTAL", 0.0)
+            continue
+
+        try:
+            events = json.loads(content)["traceEvents"]
+        except (ValueError, KeyError, TypeError):
+            continue
+        for event in events:
+            if event.get("ph") != "X":
+                continue
+            name = event.get("name", "")
+            seconds = event.get("dur", 0) / 1e6
+            detail = event.get("args", {}).get("detail", "")
+            if name == "Source":
+                _add(headers, os.path.normpath(detail), seconds, unit)
+            elif name in _TEMPLATE_EVENTS:
+                _add(templates, detail, seconds, unit)
+            elif name in _CODEGEN_EVENTS:
+                _add(codegen, detail, seconds, unit)
+            elif name == "Total ExecuteCompiler":
+                units[unit] = seconds
+            elif name.startswith("Total "):
+                _add(phases, name[len("Total ") :], seconds, unit)
+
+    def rows(table):
+        rows = [{"name": k, "seconds": v[0], "count": v[1], "units": len(v[2])} for k, v in table.items()]
+        return sorted(rows, key=lambda row: row["seconds"], reverse=True)
+
+    return {
+        "units": sorted(({"name": k, "seconds": v} for k, v in units.items()), key=lambda r: -r["seconds"]),
+        "headers": rows(headers),
+        "templates": rows(templates),
+        "codegen": rows(codegen),
+        "phases": rows(phases),
+    }
+
+
+def pch_candidates(report, pch_header=None, top=10):
+    """Return the headers worth precompiling: included by at least half the translation units, slowest first."""
+    unit_count = len(report["units"])
+    threshold = max(2, unit_count / 2)
+    candidates = []
+    for row in report["headers"]:
+        if row["units"] < threshold:
+            continue
+        if pch_header is not None and os.path.normcase(row["name"]).endswith(os.path.normcase(pch_header)):
+            continue
+        candidates.append(row)
+        if len(candidates) == top:
+            break
+    return candidates
+
+
+def print_time_trace_summary(report, top, pch_header=None):
+    print("\nCompile time summary:")
+    print("  %d translation units" % len(report["units"]))
+    sections = (
+        ("units", "Slowest translation units"),
+        ("headers", "Most expensive headers (parse time summed over the units including them)"),
+        ("templates", "Most expensive template instantiations"),
+        ("codegen", "Most expensive functions to generate code for"),
+        ("phases", "Compiler phases"),
+    )
+    for key, title in sections:
+        if not report[key]:
+            continue
+        print("  %s:" % title)
+        for row in report[key][:top]:
+            count = "  (%d units)" % row["units"] if "units" in row else ""
+            print("    %8.2fs  %s%s" % (row["seconds"], row["name"], count))
+
+    if not report["headers"]:
+        print("  Per header times are only available with Clang.")
+        return
+    candidates = pch_candidates(report, pch_header, top)
+    if candidates:
+        print("  Precompiled header candidates, to include from the header passed to `env.SetupPCH`:")
+        for row in candidates:
+            print("    %8.2fs  %s  (%d/%d units)" % (row["seconds"], row["name"], row["units"], len(report["units"])))
+
+
+def _finish(env, path, top):
+    report = aggregate_traces(_traces)
+    if not report["units"]:
+        return
+    report["pch_candidates"] = [row["name"] for row in pch_candidates(report, _pch_header(env), top)]
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=1)
+    print_time_trace_summary(report, top, _pch_header(env))
+
+
+def _pch_header(env):
+    setup = env.get("PCH_SETUP")
+    return setup[0] if setup else None
+
+
+def setup_time_trace(env, path, top=10):
+    """Time each compile with `-ftime-trace` (Clang) or `-ftime-report` (GCC), and report where the time goes.
+
+    Once the build exits, the traces of every object are aggregated into `path` and summarized: slowest translation
+    units, headers, template instantiations and code generation, and the headers worth precompiling. Objects
+    retrieved from a cache keep the trace of their last local compile, if any.
+    """
+    global _report
+
+    from build.toolchain import using_clang
+
+    if env.get("is_msvc", False):
+        print("time_trace requires Clang or GCC, ignoring it.")
+        return
+    if using_clang(env):
+        env.Append(CCFLAGS=["-ftime-trace"])
+        env["TIME_TRACE"] = "clang"
+    else:
+        if os.name == "nt":
+            print("time_trace with GCC requires a POSIX shell, ignoring it.")
+            return
+        env.Append(CCFLAGS=["-ftime-report"])
+        env["TIME_TRACE"] = "gcc"
+        env["SPAWN"] = time_report_spawn(env["SPAWN"])
+    add_object_emitter(env, _time_trace_emitter, CXX_SUFFIXES + C_SUFFIXES)
+
+    # Variants share a single report.
+    if _report is None:
+        _report = path
+        atexit.register(_finish, env, path, top)
+        print("Compile time trace enabled... (report: '" + path + "')")
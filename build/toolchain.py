@@ -0,0 +1,199 @@
+import atexit
+import json
+import os
+import re
+import shlex
+import subprocess
+import tempfile
+
+TOOLCHAIN_CACHE_FILE = ".scons_toolchain_cache"
+
+_cache = None
+_cache_path = None
+_cache_dirty = False
+
+
+def _get_cache(env):
+    global _cache, _cache_path
+
+    if _cache is None:
+        _cache_path = os.path.join(env.Dir("#").abspath, TOOLCHAIN_CACHE_FILE)
+        try:
+            with open(_cache_path, "r", encoding="utf-8") as file:
+                _cache = json.load(file)
+        except (OSError, ValueError):
+            _cache = {}
+        atexit.register(_save_cache)
+    return _cache
+
+
+def _save_cache():
+    if not _cache_dirty:
+        return
+    try:
+        with open(_cache_path + ".tmp", "w", encoding="utf-8") as file:
+            json.dump(_cache, file, indent=1, sort_keys=True)
+        os.replace(_cache_path + ".tmp", _cache_path)
+    except OSError:
+        pass
+
+
+def _mark_dirty():
+    global _cache_dirty
+    _cache_dirty = True
+
+
+def compiler_command(env, var="CXX"):
+    """Return the compiler of `var` as a list of arguments, without any ccache/sccache prefix.
+
+    Paths with spaces are kept whole, either quoted in a string or as an element of a list.
+    """
+    from SCons.Util import is_List
+
+    from build.launcher import strip_launcher
+
+    value = env.get(var, "")
+    if is_List(value):
+        return strip_launcher([env.subst(str(arg)) for arg in env.Flatten(value)])
+    if os.name == "nt":
+        # Backslashes are path separators, not escapes.
+        return strip_launcher([arg.strip('"') for arg in shlex.split(env.subst(value), posix=False)])
+    return strip_launcher(shlex.split(env.subst(value)))
+
+
+def compiler_path(env, var="CXX"):
+    command = compiler_command(env, var)
+    if not command:
+        return None
+    return env.WhereIs(command[0]) or (command[0] if os.path.isfile(command[0]) else None)
+
+
+def _entry(env, var="CXX"):
+    """Return the cache entry of the compiler in `var`, keyed by its resolved path, size and mtime."""
+    path = compiler_path(env, var)
+    if path is None:
+        return None
+    path = os.path.realpath(path)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    key = "{}|{}|{}".format(path, st.st_size, st.st_mtime_ns)
+    cache = _get_cache(env)
+    if key not in cache:
+        cache[key] = {"flags": {}, "link_flags": {}}
+        _mark_dirty()
+    return cache[key]
+
+
+def probe_compiler(env, var="CXX"):
+    """Return `{"id", "version", "version_string"}` for the compiler in `var`.
+
+    `id` is one of "gcc", "clang", "apple-clang", "msvc" or "unknown".
+    """
+    if env.get("is_msvc", False) and "clang" not in os.path.basename(" ".join(compiler_command(env, var))):
+        return {"id": "msvc", "version": [], "version_string": ""}
+
+    entry = _entry(env, var)
+    if entry is None:
+        return {"id": "unknown", "version": [], "version_string": ""}
+
+    if "id" not in entry:
+        try:
+            output = subprocess.check_output(
+                compiler_command(env, var) + ["--version"], stderr=subprocess.STDOUT, env=env["ENV"]
+            ).decode("utf-8", "replace")
+        except (subprocess.CalledProcessError, OSError):
+            print("Couldn't parse {} environment variable to infer compiler version.".format(var))
+            output = ""
+        first_line = output.strip().splitlines()[0] if output.strip() else ""
+        if first_line.startswith("Apple"):
+            compiler_id = "apple-clang"
+        elif "clang" in first_line:
+            compiler_id = "clang"
+        elif "Free Software Foundation" in output or "GCC" in first_line or "g++" in first_line:
+            compiler_id = "gcc"
+        else:
+            compiler_id = "unknown"
+        match = re.search(r"(\d+)\.(\d+)(?:\.(\d+))?", first_line)
+        entry["id"] = compiler_id
+        entry["version"] = [int(v) for v in match.groups() if v is not None] if match else []
+        entry["version_string"] = first_line
+        _mark_dirty()
+
+    return {"id": entry["id"], "version": entry["version"], "version_string": entry["version_string"]}
+
+
+def _try_compile(env, var, args, source, link):
+    with tempfile.TemporaryDirectory() as tmp:
+        source_path = os.path.join(tmp, "probe.cpp")
+        with open(source_path, "w", encoding="utf-8") as file:
+            file.write(source)
+        output = os.path.join(tmp, "probe.out" if link else "probe.o")
+        command = compiler_command(env, var) + args + ([] if link else ["-c"]) + ["-o", output, source_path]
+        try:
+            result = subprocess.run(
+                command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, cwd=tmp, env=env["ENV"]
+            )
+        except OSError:
+            return False
+        return result.returncode == 0
+
+
+def supports_flag(env, flag, var="CXX"):
+    """Return whether the compiler accepts `flag`, probing it only once per compiler binary."""
+    if env.get("is_msvc", False):
+        return False
+    entry = _entry(env, var)
+    if entry is None:
+        return False
+    if flag not in entry["flags"]:
+        entry["flags"][flag] = _try_compile(env, var, ["-Werror", flag], "int probe() { return 0; }\n", False)
+        _mark_dirty()
+    return entry["flags"][flag]
+
+
+def linker_supports(env, flag, var="CXX"):
+    """Return whether linking through the compiler driver accepts `flag`, e.g. `-fuse-ld=mold`.
+
+    `flag` may also be a list of flags that have to be accepted together.
+    """
+    if env.get("is_msvc", False):
+        return False
+    entry = _entry(env, var)
+    if entry is None:
+        return False
+    flags = flag if isinstance(flag, list) else [flag]
+    key = " ".join(flags)
+    if key not in entry["link_flags"]:
+        entry["link_flags"][key] = _try_compile(env, var, flags, "int main() { return 0; }\n", True)
+        _mark_dirty()
+    return entry["link_flags"][key]
+
+
+def tool_exists(env, name, exists, key_vars=("PATH",)):
+    """Memoize an SCons `exists()` detection, keyed by the environment variables it depends on.
+
+    Only toolchains that were found are remembered, one installed later is found by the next build.
+    """
+    key = "tool|{}|{}".format(name, "|".join(os.environ.get(v, "") for v in key_vars))
+    cache = _get_cache(env)
+    if key in cache:
+        return True
+    found = bool(exists(env))
+    if found:
+        cache[key] = True
+        _mark_dirty()
+    return found
+
+
+def using_clang(env):
+    command = compiler_command(env, "CC")
+    return bool(command) and "clang" in os.path.basename(command[0])
+
+
+def is_vanilla_clang(env):
+    if not using_clang(env):
+        return False
+    probe = probe_compiler(env)
+    return bool(probe["version_string"]) and probe["id"] != "apple-clang"
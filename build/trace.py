@@ -0,0 +1,129 @@
+import atexit
+import contextlib
+import json
+import threading
+import time
+
+from build.task_hooks import add_execute_hook, job_slot, task_kind
+
+
+def setup_build_trace(env, path, top=10):
+    """Record every executed node and write a Chrome/Perfetto trace to `path` when the build exits."""
+    from SCons.Node.Alias import Alias
+    from SCons.Node.FS import Dir
+
+    records = []
+    lock = threading.Lock()
+    build_start = time.perf_counter()
+
+    def record_task(task, start, end):
+        node = task.targets[0]
+        if isinstance(node, (Dir, Alias)):
+            return
+        record = {
+            "node": node,
+            "name": str(node),
+            "kind": task_kind(task),
+            "slot": job_slot(),
+            "start": start - build_start,
+            "end": end - build_start,
+            "cached": bool(getattr(node, "cached", 0)),
+        }
+        with lock:
+            records.append(record)
+
+    @contextlib.contextmanager
+    def trace_hook(task):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            record_task(task, start, time.perf_counter())
+
+    def finish():
+        if not records:
+            return
+        write_trace(path, records)
+        print_trace_summary(records, env.GetOption("num_jobs"), top)
+
+    # Run before anything that keeps the job threads busy.
+    add_execute_hook(trace_hook, priority=100)
+    atexit.register(finish)
+    print("Build trace enabled... (path: '" + path + "')")
+
+
+def write_trace(path, records):
+    events = [
+        {
+            "name": r["name"],
+            "cat": r["kind"],
+            "ph": "X",
+            "ts": round(r["start"] * 1e6),
+            "dur": round((r["end"] - r["start"]) * 1e6),
+            "pid": 1,
+            "tid": r["slot"],
+            "args": {"cache": "hit" if r["cached"] else "miss"},
+        }
+        for r in records
+    ]
+    events += [
+        {"name": "thread_name", "ph": "M", "pid": 1, "tid": slot, "args": {"name": "job %d" % slot}}
+        for slot in sorted({r["slot"] for r in records})
+    ]
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+
+
+def critical_path(records):
+    """Return `(length, nodes)` of the longest chain of dependent executed nodes."""
+    by_node = {r["node"]: r for r in records}
+    best = {}
+
+    def visit(node):
+        if node in best:
+            return best[node]
+        # Guard against cycles while the node is being visited.
+        best[node] = (0.0, [])
+        length, chain = 0.0, []
+        for child in node.children(scan=0):
+            if child in by_node:
+                child_length, child_chain = visit(child)
+                if child_length > length:
+                    length, chain = child_length, child_chain
+        record = by_node[node]
+        best[node] = (length + record["end"] - record["start"], chain + [record["name"]])
+        return best[node]
+
+    result = (0.0, [])
+    for node in by_node:
+        candidate = visit(node)
+        if candidate[0] > result[0]:
+            result = candidate
+    return result
+
+
+def print_trace_summary(records, num_jobs, top):
+    def duration(r):
+        return r["end"] - r["start"]
+
+    wall = max(r["end"] for r in records) - min(r["start"] for r in records)
+    busy = sum(duration(r) for r in records)
+    hits = sum(1 for r in records if r["cached"])
+
+    print("\nBuild trace summary:")
+    print("  %d nodes executed (%d retrieved from cache) in %.2fs" % (len(records), hits, wall))
+    for kind, title in (("compile", "compiles"), ("link", "links")):
+        slowest = sorted((r for r in records if r["kind"] == kind), key=duration, reverse=True)[:top]
+        if not slowest:
+            continue
+        print("  Slowest %s:" % title)
+        for r in slowest:
+            print("    %8.2fs  %s%s" % (duration(r), r["name"], " (cached)" if r["cached"] else ""))
+
+    length, chain = critical_path(records)
+    print("  Critical path: %.2fs over %d nodes" % (length, len(chain)))
+    for name in chain[-top:]:
+        print("    " + name)
+
+    if wall > 0 and num_jobs:
+        print("  Job slot utilization: %.1f%% of %d slots" % (100.0 * busy / (wall * num_jobs), num_jobs))
@@ -0,0 +1,93 @@
+import fnmatch
+import hashlib
+import math
+import os
+
+from build.generated_file import write_generated_file
+
+UNITY_SUFFIX = ".unity.gen.cpp"
+UNITY_TARGET_BYTES = 256 * 1024
+UNITY_MAX_AUTO_BATCH = 64
+
+
+def unity_build(env, sources, exclude=None):
+    """Merge variant source nodes into generated unity translation units.
+
+    Sources are grouped per directory, and batch boundaries are picked from a hash of each file name, so adding or
+    removing a file only changes the batch that contains it.
+    """
+    if not env.get("unity_build", False):
+        return sources
+
+    from SCons.Errors import UserError
+
+    try:
+        batch_size = int(env.get("unity_batch_size", 0))
+    except ValueError:
+        raise UserError("'unity_batch_size' must be an integer: %s" % env["unity_batch_size"])
+
+    if isinstance(exclude, str):
+        exclude = [exclude]
+    patterns = [p.strip() for p in env.get("unity_exclude", "").split(",") if p.strip()] + list(exclude or [])
+    patterns = [p.replace("\\", "/") for p in patterns]
+
+    out = []
+    groups = {}
+    for node in sources:
+        src = node.srcnode()
+        src_path = src.path.replace("\\", "/")
+        if os.path.splitext(src_path)[1] not in (".cpp", ".cc", ".cxx") or any(
+            fnmatch.fnmatch(src_path, p) or fnmatch.fnmatch(src.name, p) for p in patterns
+        ):
+            out.append(node)
+            continue
+        groups.setdefault(node.dir, []).append(node)
+
+    for directory in sorted(groups, key=lambda d: d.abspath):
+        nodes = sorted(groups[directory], key=lambda n: n.name)
+        size = batch_size if batch_size > 0 else _auto_batch_size(nodes)
+        for batch in _split_batches(nodes, size):
+            if len(batch) == 1:
+                out.append(batch[0])
+                continue
+            unity_node = directory.File(os.path.splitext(batch[0].name)[0] + env.subst("$UNITYSUFFIX"))
+            includes = [os.path.relpath(n.srcnode().abspath, directory.abspath).replace("\\", "/") for n in batch]
+            env.Precious(env.Command(unity_node, env.Value(includes), env.Run(_unity_builder)))
+            out.append(unity_node)
+
+    return out
+
+
+def _auto_batch_size(nodes):
+    sizes = [n.srcnode().getsize() for n in nodes if n.srcnode().exists()]
+    if not sizes:
+        return 1
+    average = max(1, sum(sizes) // len(sizes))
+    # Round to a power of two, so the batch size and its boundaries don't drift with every small edit.
+    exponent = round(math.log2(max(1, UNITY_TARGET_BYTES // average)))
+    return min(UNITY_MAX_AUTO_BATCH, 1 << max(0, exponent))
+
+
+def _split_batches(nodes, batch_size):
+    if batch_size <= 1:
+        return [[n] for n in nodes]
+
+    # Content-defined chunking on the file names: a batch ends after any file whose hash is a multiple of the
+    # batch size, so a boundary only depends on the files right before it and not on the rest of the directory.
+    mask = (1 << (batch_size - 1).bit_length()) - 1
+    min_size = max(2, batch_size // 2)
+    batches = []
+    current = []
+    for node in nodes:
+        current.append(node)
+        name_hash = int.from_bytes(hashlib.md5(node.name.encode()).digest()[:4], "little")
+        if (len(current) >= min_size and name_hash & mask == 0) or len(current) >= 2 * batch_size:
+            batches.append(current)
+            current = []
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _unity_builder(target, source, env):
+    write_generated_file(str(target[0]), "".join(f'#include "{include}"\n' for include in source[0].read()))
@@ -0,0 +1,110 @@
+import collections
+import copy
+
+# Set up again for each variant instead of copied from the base environment.
+_PCH_VARIABLES = (
+    "PCH_SETUP",
+    "PCH",
+    "PCHSTOP",
+    "GCHCOM",
+    "SHGCHCOM",
+    "GCHEXTRAFLAGS",
+    "GCHSUFFIX",
+    "GCHHEADER",
+    "GCHDIR",
+    "GCHNODES",
+    "PCHINCLUDEFLAGS",
+    "GCHVARIANTDIR",
+)
+_NOT_REPLAYED = ("BUILDERS", "SCANNERS", "VARIANT") + _PCH_VARIABLES
+# Flags are `CLVar`s and `CPPDEFINES` a deque.
+_LISTS = (list, collections.UserList, collections.deque)
+
+
+def parse_variants(value, options):
+    """Return `(name, overrides)` for each variant listed in `variants`.
+
+    Variants are comma-separated, each one is a `target` and/or `option=value` pairs joined with `+`, like
+    `template_release+precision=double`. The name is made of the target and option values, joined with dots.
+    """
+    from SCons.Errors import UserError
+
+    variants = []
+    for entry in value.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        overrides = {}
+        for part in entry.split("+"):
+            key, sep, val = part.strip().partition("=")
+            if not sep:
+                key, val = "target", key
+            key, val = key.strip(), val.strip()
+            if key not in options or key == "variants":
+                raise UserError("Unknown option '%s' in variant: %s" % (key, entry))
+            overrides[key] = val
+        name = ".".join(overrides.values())
+        if name in (n for n, _ in variants):
+            raise UserError("Variant listed twice: %s" % entry)
+        variants.append((name, overrides))
+    return variants
+
+
+def snapshot(env):
+    """Record the construction variables of `env`, so later changes can be replayed on its variants."""
+    env._variant_snapshot = {key: copy.copy(value) for key, value in env.Dictionary().items()}
+
+
+def _replay(env, before, variant):
+    for key, value in env.Dictionary().items():
+        if key in _NOT_REPLAYED:
+            continue
+        previous = before.get(key)
+        if previous == value:
+            continue
+        if isinstance(value, _LISTS) and isinstance(previous, _LISTS):
+            # Appended or prepended to, keep what the variant configured itself.
+            value, previous = list(value), list(previous)
+            if value[: len(previous)] == previous:
+                variant.Append(**{key: value[len(previous) :]})
+                continue
+            if value[-len(previous) :] == previous:
+                variant.Prepend(**{key: value[: -len(previous)]})
+                continue
+        if isinstance(value, dict) and isinstance(previous, dict):
+            variant[key].update({k: v for k, v in value.items() if previous.get(k) != v})
+            continue
+        variant[key] = copy.copy(value)
+
+
+def variant_environments(env):
+    """Return the environment of every variant, each one split into its CPU levels.
+
+    Changes made to `env` since `env.FinalizeOptions()`, like include paths and defines, are applied to the other
+    variants first, and they set up their own precompiled header if `env.SetupPCH` was called.
+    """
+    from build.cpu_level import cpu_level_variants
+    from build.pch import setup_pch
+
+    variants = getattr(env, "variant_envs", None) or [env]
+    before = getattr(env, "_variant_snapshot", None)
+    if before is not None:
+        for variant in variants[1:]:
+            _replay(env, before, variant)
+            if "PCH_SETUP" in env:
+                setup_pch(variant, *env["PCH_SETUP"])
+        # Only replay later changes if called again.
+        snapshot(env)
+
+    return [level for variant in variants for level in cpu_level_variants(variant)]
+
+
+def setup_variant(env, name):
+    """Give the objects, unity sources and precompiled header of variant `name` their own names, so variants can share
+    a variant directory."""
+    env["VARIANT"] = name
+    env["PCH_SUBDIR"] = name
+    # Resolve them all before changing them, SHOBJSUFFIX may refer to OBJSUFFIX.
+    suffixes = {var: env.subst("$" + var) for var in ("OBJSUFFIX", "SHOBJSUFFIX", "UNITYSUFFIX")}
+    for var, suffix in suffixes.items():
+        env[var] = "." + name + suffix
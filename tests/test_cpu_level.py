@@ -0,0 +1,53 @@
+from typing import Any, Dict
+
+import pytest
+
+from build.cpu_level import cpu_level_flags, parse_cpu_levels
+
+
+class FakeEnv(Dict[str, Any]):
+    def Exit(self, code):
+        raise SystemExit(code)
+
+
+def test_no_level_adds_no_flags():
+    assert cpu_level_flags(FakeEnv(), None) == ([], [])
+
+
+def test_gnu_flags():
+    assert cpu_level_flags(FakeEnv(), "x86-64-v3") == (["-march=x86-64-v3"], ["-march=x86-64-v3"])
+    assert cpu_level_flags(FakeEnv(), "armv8.2-a") == (["-march=armv8.2-a"], ["-march=armv8.2-a"])
+
+
+def test_gnu_baseline_is_spelled_x86_64():
+    assert cpu_level_flags(FakeEnv(), "x86-64-v1") == (["-march=x86-64"], ["-march=x86-64"])
+
+
+@pytest.mark.parametrize(
+    "level, flags",
+    [
+        ("x86-64-v1", []),
+        ("x86-64-v2", ["/arch:SSE4.2"]),
+        ("x86-64-v4", ["/arch:AVX512"]),
+        ("armv8-a", ["/arch:armv8.0"]),
+        ("armv8.2-a", ["/arch:armv8.2"]),
+        ("armv9-a", ["/arch:armv9.0"]),
+    ],
+)
+def test_msvc_flags(level, flags):
+    assert cpu_level_flags(FakeEnv(is_msvc=True), level) == (flags, [])
+
+
+def test_parse_levels_and_aliases():
+    env = FakeEnv(cpu_level=" v2, x86-64-v4 ,x86-64,", arch="x86_64")
+    assert parse_cpu_levels(env) == ["x86-64-v2", "x86-64-v4", "x86-64-v1"]
+
+
+def test_parse_empty():
+    assert parse_cpu_levels(FakeEnv(cpu_level="", arch="x86_64")) == []
+
+
+@pytest.mark.parametrize("level, arch", [("armv8-a", "x86_64"), ("v3", "arm64"), ("v2", "x86_32")])
+def test_parse_rejects_levels_of_other_architectures(level, arch):
+    with pytest.raises(SystemExit):
+        parse_cpu_levels(FakeEnv(cpu_level=level, arch=arch))
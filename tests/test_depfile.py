@@ -0,0 +1,45 @@
+import json
+import os
+
+from build.depfile import parse_make_depfile, parse_msvc_depfile
+
+
+def test_single_line_rule():
+    assert parse_make_depfile("build/a.o: src/a.cpp src/a.hpp\n") == ["src/a.cpp", "src/a.hpp"]
+
+
+def test_continued_lines():
+    content = "build/a.o: src/a.cpp \\\n  src/a.hpp \\\r\n  src/b.hpp\n"
+    assert parse_make_depfile(content) == ["src/a.cpp", "src/a.hpp", "src/b.hpp"]
+
+
+def test_only_the_first_rule():
+    # -MP adds an empty rule per header.
+    content = "a.o: a.cpp a.hpp\n\na.hpp:\n"
+    assert parse_make_depfile(content) == ["a.cpp", "a.hpp"]
+
+
+def test_escaped_characters():
+    content = "a.o: dir\\ with\\ spaces/a.cpp \\#hash.hpp cost$$.hpp\n"
+    assert parse_make_depfile(content) == ["dir with spaces/a.cpp", "#hash.hpp", "cost$.hpp"]
+
+
+def test_drive_letters_are_not_separators():
+    content = "C:/build/a.o: C:/src/a.cpp C:\\src\\a.hpp\n"
+    assert parse_make_depfile(content) == ["C:/src/a.cpp", "C:\\src\\a.hpp"]
+
+
+def test_no_rule():
+    assert parse_make_depfile("") == []
+    assert parse_make_depfile("not a rule\n") == []
+
+
+def test_rule_without_prerequisites():
+    assert parse_make_depfile("a.o:\n") == []
+
+
+def test_msvc_system_includes_are_skipped():
+    system = os.path.join(os.path.normcase(os.path.join("sdk", "include")), "")
+    includes = [os.path.join("src", "a.hpp"), os.path.join("sdk", "include", "vector")]
+    content = json.dumps({"Version": "1.2", "Data": {"Source": "a.cpp", "Includes": includes}})
+    assert parse_msvc_depfile(content, (system,)) == [os.path.join("src", "a.hpp")]
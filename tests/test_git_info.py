@@ -0,0 +1,231 @@
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from build import git_info
+from build.git_info import GitObjectReader, _apply_delta, _describe, _list_tags, _read_packed_refs
+
+requires_git = pytest.mark.skipif(shutil.which("git") is None, reason="git is not installed")
+
+
+def git(cwd, *args, **kwargs):
+    return subprocess.run(["git", *args], cwd=cwd, check=True, capture_output=True, **kwargs).stdout
+
+
+def make_repository(path):
+    git(path, "init", "-q")
+    git(path, "config", "user.name", "Test")
+    git(path, "config", "user.email", "test@example.com")
+    lines = ["line %d\n" % i for i in range(200)]
+    for i in range(5):
+        # Small edits of a large file, so packing stores most versions as deltas.
+        lines[i * 30] = "edited %d\n" % i
+        with open(os.path.join(path, "file.txt"), "w") as file:
+            file.write("".join(lines))
+        git(path, "add", "file.txt")
+        git(path, "commit", "-q", "-m", "commit %d" % i)
+
+
+def all_objects(path):
+    output = git(path, "cat-file", "--batch-all-objects", "--batch-check=%(objectname) %(objecttype)")
+    return [line.split() for line in output.decode().splitlines()]
+
+
+def delta_count(path):
+    pack = next(name for name in os.listdir(os.path.join(path, ".git", "objects", "pack")) if name.endswith(".idx"))
+    output = git(path, "verify-pack", "-v", os.path.join(".git", "objects", "pack", pack))
+    # Deltified objects list their depth and base after the type, size, packed size and offset.
+    return sum(1 for line in output.decode().splitlines() if len(line.split()) == 7)
+
+
+def check_objects(path):
+    reader = GitObjectReader(os.path.join(path, ".git"))
+    for sha, obj_type in all_objects(path):
+        assert reader.read(sha) == (obj_type, git(path, "cat-file", obj_type, sha))
+
+
+def test_apply_delta_copies_and_inserts():
+    base = b"0123456789abcdef"
+    # Source and result sizes, copy 4 bytes at offset 2, insert "XY", copy 3 bytes at offset 10.
+    delta = bytes([16, 9, 0x91, 2, 4, 2]) + b"XY" + bytes([0x91, 10, 3])
+    assert _apply_delta(base, delta) == b"2345XYabc"
+
+
+def test_apply_delta_copy_size_zero_means_64k():
+    base = bytes(range(256)) * 512
+    delta = bytes([0x80, 0x80, 0x08, 0x80, 0x80, 0x04, 0x80])
+    assert _apply_delta(base, delta) == base[:0x10000]
+
+
+@requires_git
+def test_reads_loose_objects(tmp_path):
+    make_repository(str(tmp_path))
+    check_objects(str(tmp_path))
+
+
+@requires_git
+def test_reads_offset_deltas(tmp_path):
+    make_repository(str(tmp_path))
+    git(str(tmp_path), "repack", "-a", "-d", "-q")
+    git(str(tmp_path), "prune-packed")
+    assert delta_count(str(tmp_path)) > 0
+    check_objects(str(tmp_path))
+
+
+@requires_git
+def test_reads_reference_deltas(tmp_path):
+    make_repository(str(tmp_path))
+    objects = "".join(sha + "\n" for sha, _ in all_objects(str(tmp_path)))
+    # Without --delta-base-offset, deltas refer to their base by name.
+    git(str(tmp_path), "pack-objects", "-q", os.path.join(".git", "objects", "pack", "pack"), input=objects.encode())
+    git(str(tmp_path), "prune-packed")
+    assert delta_count(str(tmp_path)) > 0
+    check_objects(str(tmp_path))
+
+
+def commit(path, message, timestamp):
+    date = "@%d +0000" % timestamp
+    env = dict(os.environ, GIT_AUTHOR_DATE=date, GIT_COMMITTER_DATE=date)
+    git(path, "commit", "-q", "--allow-empty", "-m", message, env=env)
+    return git(path, "rev-parse", "HEAD").decode().strip()
+
+
+def describe(path):
+    git_folder = os.path.join(path, ".git")
+    head = git(path, "rev-parse", "HEAD").decode().strip()
+    tags = _list_tags(git_folder, _read_packed_refs(git_folder))
+    return _describe(GitObjectReader(git_folder), head, tags)
+
+
+def git_describe(path):
+    return git(path, "describe", "--tags", "--abbrev=0").decode().strip()
+
+
+@pytest.fixture
+def repository(tmp_path):
+    path = str(tmp_path)
+    git(path, "init", "-q", "-b", "main")
+    git(path, "config", "user.name", "Test")
+    git(path, "config", "user.email", "test@example.com")
+    return path
+
+
+@requires_git
+def test_describe_without_tags(repository):
+    commit(repository, "first", 1000)
+    assert describe(repository) is None
+
+
+@requires_git
+def test_describe_closest_tag(repository):
+    commit(repository, "first", 1000)
+    git(repository, "tag", "v1")
+    commit(repository, "second", 2000)
+    git(repository, "tag", "-a", "v2", "-m", "v2")
+    commit(repository, "third", 3000)
+    assert describe(repository) == git_describe(repository) == "v2"
+
+
+@requires_git
+def test_describe_prefers_annotated_tags(repository):
+    commit(repository, "first", 1000)
+    git(repository, "tag", "a-lightweight")
+    git(repository, "tag", "-a", "z-annotated", "-m", "annotated")
+    assert describe(repository) == git_describe(repository) == "z-annotated"
+
+
+@requires_git
+def test_describe_merges(repository):
+    commit(repository, "base", 1000)
+    git(repository, "tag", "v1")
+    git(repository, "checkout", "-q", "-b", "feature")
+    for i in range(3):
+        commit(repository, "feature %d" % i, 2000 + i)
+    git(repository, "tag", "feature-tag")
+    git(repository, "checkout", "-q", "main")
+    commit(repository, "main", 3000)
+    git(repository, "tag", "v2")
+    env = dict(os.environ, GIT_AUTHOR_DATE="@4000 +0000", GIT_COMMITTER_DATE="@4000 +0000")
+    git(repository, "merge", "-q", "--no-ff", "-m", "merge", "feature", env=env)
+    assert describe(repository) == git_describe(repository)
+
+
+@requires_git
+def test_describe_packed_and_nested_tags(repository):
+    commit(repository, "first", 1000)
+    git(repository, "tag", "-a", "release/1.0", "-m", "1.0")
+    git(repository, "pack-refs", "--all")
+    commit(repository, "second", 2000)
+    git(repository, "tag", "release/1.1")
+    assert describe(repository) == git_describe(repository) == "release/1.1"
+
+
+class TestCache:
+    @pytest.fixture(autouse=True)
+    def setup(self, repository, monkeypatch):
+        monkeypatch.chdir(repository)
+        monkeypatch.setattr(git_info, "_git_info", None)
+        for name in ("OPENVIC_TAG", "OPENVIC_RELEASE", "OPENVIC_GH_RELEASE"):
+            monkeypatch.delenv(name, raising=False)
+        self.path = repository
+        self.monkeypatch = monkeypatch
+        self.first = commit(repository, "first", 1000)
+        git(repository, "tag", "release/1.0")
+
+    def get_git_tag(self):
+        # A new build, which only has the cache file.
+        self.monkeypatch.setattr(git_info, "_git_info", None)
+        return git_info.get_git_tag()
+
+    def forbid_reading(self):
+        def fail(*args):
+            raise AssertionError("git info read again")
+
+        self.monkeypatch.setattr(git_info, "_read_git_info", fail)
+
+    @requires_git
+    def test_hit(self):
+        assert self.get_git_tag() == "release/1.0"
+        assert os.path.isfile(git_info.GIT_INFO_CACHE_FILE)
+        self.forbid_reading()
+        assert self.get_git_tag() == "release/1.0"
+
+    @requires_git
+    def test_new_commit(self):
+        self.get_git_tag()
+        second = commit(self.path, "second", 2000)
+        assert git_info.get_git_hash()["git_hash"] == self.first
+        self.monkeypatch.setattr(git_info, "_git_info", None)
+        assert git_info.get_git_hash()["git_hash"] == second
+
+    @requires_git
+    def test_tag_in_existing_nested_folder(self):
+        self.get_git_tag()
+        commit(self.path, "second", 2000)
+        assert self.get_git_tag() == "release/1.0"
+        git(self.path, "tag", "release/1.1")
+        assert self.get_git_tag() == "release/1.1"
+
+    @requires_git
+    def test_tag_moved_in_place(self):
+        self.get_git_tag()
+        second = commit(self.path, "second", 2000)
+        git(self.path, "tag", "release/0.9", self.first)
+        assert self.get_git_tag() == "release/1.0"
+        tag = os.path.join(".git", "refs", "tags", "release", "0.9")
+        stat = os.stat(tag)
+        with open(tag, "w", encoding="utf-8") as file:
+            file.write(second + "\n")
+        # Even when the folders' modification times don't change.
+        os.utime(os.path.dirname(tag), ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        assert self.get_git_tag() == "release/0.9"
+
+    @requires_git
+    def test_environment(self):
+        self.get_git_tag()
+        self.monkeypatch.setenv("OPENVIC_TAG", "fallback")
+        self.forbid_reading()
+        with pytest.raises(AssertionError):
+            self.get_git_tag()
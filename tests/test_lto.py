@@ -0,0 +1,25 @@
+import pytest
+from SCons.Errors import UserError
+
+from build.lto import cache_policy
+
+
+def test_no_size_means_no_policy():
+    assert cache_policy("") is None
+    assert cache_policy("  ") is None
+
+
+def test_megabytes():
+    assert cache_policy("512") == "cache_size_bytes=512m"
+    assert cache_policy(" 1.5 ") == "cache_size_bytes=1m"
+    assert cache_policy(256) == "cache_size_bytes=256m"
+
+
+def test_percentage_of_free_space():
+    assert cache_policy("10%") == "cache_size=10%"
+
+
+@pytest.mark.parametrize("size", ["big", "10MB"])
+def test_invalid_sizes(size):
+    with pytest.raises(UserError):
+        cache_policy(size)
@@ -0,0 +1,92 @@
+import os
+
+import pytest
+
+from build import response_file
+from build.response_file import _response_file_arg, _tool_index, response_file_spawn
+
+
+@pytest.mark.parametrize(
+    "args, index",
+    [
+        (["g++", "-c"], 0),
+        (["x86_64-w64-mingw32-g++", "-c"], 0),
+        (["clang-18", "-c"], 0),
+        (["/usr/bin/gcc-ar", "rc"], 0),
+        (['"C:\\Program Files\\LLVM\\bin\\clang-cl.exe"', "/c"], 0),
+        (["LINK.EXE", "/OUT:a.exe"], 0),
+        (["ld.lld", "-o"], 0),
+        (["ccache", "g++", "-c"], 1),
+        (["sccache.exe", "cl", "/c"], 1),
+        (["python", "script.py"], None),
+        (["ccache", "python"], None),
+        (["strip", "a.out"], None),
+    ],
+)
+def test_tool_index(args, index):
+    assert _tool_index(args) == index
+
+
+def test_posix_arguments_are_kept(monkeypatch):
+    monkeypatch.setattr(response_file.os, "name", "posix")
+    assert _response_file_arg("'a b'\\c", False) == "'a b'\\c"
+
+
+def test_windows_gnu_arguments_escape_backslashes(monkeypatch):
+    monkeypatch.setattr(response_file.os, "name", "nt")
+    assert _response_file_arg('"C:\\a b\\c.o"', False) == '"C:\\\\a b\\\\c.o"'
+
+
+def test_windows_msvc_arguments_are_kept(monkeypatch):
+    monkeypatch.setattr(response_file.os, "name", "nt")
+    assert _response_file_arg('"C:\\a b\\c.obj"', True) == '"C:\\a b\\c.obj"'
+
+
+class RecordingSpawn:
+    def __init__(self):
+        self.args = None
+        self.content = None
+
+    def __call__(self, sh, escape, cmd, args, env):
+        self.args = args
+        if args[-1].startswith("@"):
+            with open(args[-1][1:], "r", encoding="utf-8") as file:
+                self.content = file.read()
+        return 0
+
+
+def escape(arg):
+    return arg
+
+
+def test_short_command_lines_are_unchanged():
+    spawn = RecordingSpawn()
+    args = ["g++", "-c", "a.cpp"]
+    assert response_file_spawn(spawn, threshold=100)("sh", escape, "g++", args, {}) == 0
+    assert spawn.args == args
+
+
+def test_long_command_lines_use_a_response_file():
+    spawn = RecordingSpawn()
+    objects = ["object_%d.o" % i for i in range(20)]
+    args = ["ccache", "g++", "-o", "prog"] + objects
+    response_file_spawn(spawn, threshold=100)("sh", escape, "g++", args, {})
+    assert spawn.args[:2] == ["ccache", "g++"]
+    assert len(spawn.args) == 3
+    assert spawn.content == "\n".join(["-o", "prog"] + objects) + "\n"
+    assert not os.path.exists(spawn.args[2][1:])
+
+
+def test_redirections_stay_on_the_command_line():
+    spawn = RecordingSpawn()
+    args = ["link", "/OUT:a.exe"] + ["object_%d.obj" % i for i in range(20)] + [">out.txt"]
+    response_file_spawn(spawn, threshold=100)("sh", escape, "link", args, {})
+    assert spawn.args[-1] == ">out.txt"
+    assert spawn.args[1].startswith("@")
+
+
+def test_unknown_tools_are_unchanged():
+    spawn = RecordingSpawn()
+    args = ["python", "script.py"] + ["argument_%d" % i for i in range(20)]
+    response_file_spawn(spawn, threshold=100)("sh", escape, "python", args, {})
+    assert spawn.args == args
@@ -0,0 +1,42 @@
+from build.unity import _split_batches
+
+
+class FakeNode:
+    def __init__(self, name):
+        self.name = name
+
+
+def names(batches):
+    return [[node.name for node in batch] for batch in batches]
+
+
+def make_nodes(count):
+    return [FakeNode("file_%03d.cpp" % i) for i in range(count)]
+
+
+def test_batch_size_one_keeps_sources_apart():
+    nodes = make_nodes(5)
+    assert names(_split_batches(nodes, 1)) == [[node.name] for node in nodes]
+    assert names(_split_batches(nodes, 0)) == [[node.name] for node in nodes]
+
+
+def test_batches_keep_every_source_in_order():
+    nodes = make_nodes(100)
+    batches = _split_batches(nodes, 8)
+    assert [node for batch in batches for node in batch] == nodes
+
+
+def test_batch_sizes_are_bounded():
+    batches = _split_batches(make_nodes(200), 8)
+    assert all(len(batch) <= 16 for batch in batches)
+    assert all(len(batch) >= 4 for batch in batches[:-1])
+
+
+def test_removing_a_source_only_changes_its_batch():
+    nodes = make_nodes(60)
+    before = names(_split_batches(nodes, 4))
+    removed = nodes.pop(30)
+    after = names(_split_batches(nodes, 4))
+    changed = [batch for batch in before if batch not in after]
+    assert len(changed) == 1
+    assert removed.name in changed[0]
@@ -0,0 +1,36 @@
+import pytest
+from SCons.Errors import UserError
+
+from build.variants import parse_variants
+
+OPTIONS = ("target", "precision", "dev_build", "variants")
+
+
+def test_targets():
+    assert parse_variants("template_debug,template_release", OPTIONS) == [
+        ("template_debug", {"target": "template_debug"}),
+        ("template_release", {"target": "template_release"}),
+    ]
+
+
+def test_options_joined_with_plus():
+    assert parse_variants(" template_release + precision=double , dev_build=yes", OPTIONS) == [
+        ("template_release.double", {"target": "template_release", "precision": "double"}),
+        ("yes", {"dev_build": "yes"}),
+    ]
+
+
+def test_empty_entries_are_ignored():
+    assert parse_variants("", OPTIONS) == []
+    assert parse_variants(",editor,,", OPTIONS) == [("editor", {"target": "editor"})]
+
+
+@pytest.mark.parametrize("value", ["template_debug+unknown=1", "variants=editor"])
+def test_unknown_options(value):
+    with pytest.raises(UserError):
+        parse_variants(value, OPTIONS)
+
+
+def test_duplicate_variants():
+    with pytest.raises(UserError):
+        parse_variants("editor,target=editor", OPTIONS)
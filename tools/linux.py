@@ -1,23 +1,39 @@
 # Based on https://github.com/godotengine/godot-cpp/blob/e83fd0904c13356ed1d4c3d09f8bb9132bdc6b77/tools/linux.py
 from build import common_compiler_flags
-from SCons.Variables import BoolVariable
+from build.cpu_level import setup_cpu_level
+from build.platform_options import linux_options
+from build.response_file import setup_response_files
+from build.toolchain import linker_supports, using_clang
 from SCons.Tool import clang, clangxx
 
 
 def options(opts):
-    opts.Add(BoolVariable("use_llvm", "Use the LLVM compiler - only effective when targeting Linux", False))
-    opts.Add(BoolVariable("use_static_cpp", "Link libgcc and libstdc++ statically for better portability", True))
-    opts.Add(BoolVariable("use_ubsan", "Use LLVM/GCC compiler undefined behavior sanitizer (UBSAN)", False))
-    opts.Add(BoolVariable("use_asan", "Use LLVM/GCC compiler address sanitizer (ASAN)", False))
-    opts.Add(BoolVariable("use_lsan", "Use LLVM/GCC compiler leak sanitizer (LSAN)", False))
-    opts.Add(BoolVariable("use_tsan", "Use LLVM/GCC compiler thread sanitizer (TSAN)", False))
-    opts.Add(BoolVariable("use_msan", "Use LLVM compiler memory sanitizer (MSAN)", False))
+    linux_options(opts)
 
 
 def exists(env):
     return True
 
 
+def select_linker(env):
+    if env["linker"] == "auto":
+        candidates = ["mold", "lld"]
+        if env["lto"] != "none" and not using_clang(env):
+            # lld can't load GCC's LTO plugin.
+            candidates.remove("lld")
+        linker = next((name for name in candidates if linker_supports(env, "-fuse-ld=" + name)), None)
+        if linker is None:
+            # Keep the toolchain's default linker.
+            return
+        env["linker"] = linker
+    elif not linker_supports(env, "-fuse-ld=" + env["linker"]):
+        print("Linker '{}' is not supported by the toolchain, install it or use `linker=auto`.".format(env["linker"]))
+        env.Exit(255)
+
+    env.Append(LINKFLAGS=["-fuse-ld=" + env["linker"]])
+    print("Using linker: " + env["linker"])
+
+
 def generate(env):
     if env["use_llvm"]:
         clang.generate(env)
@@ -32,18 +48,24 @@ def generate(env):
     if env["arch"] == "x86_64":
         # -m64 and -m32 are x86-specific already, but it doesn't hurt to
         # be clear and also specify -march=x86-64. Similar with 32-bit.
-        env.Append(CCFLAGS=["-m64", "-march=x86-64"])
-        env.Append(LINKFLAGS=["-m64", "-march=x86-64"])
+        setup_cpu_level(env, "x86-64-v1")
+        env.Append(CCFLAGS=["-m64", "$CPU_LEVEL_FLAGS"])
+        env.Append(LINKFLAGS=["-m64", "$CPU_LEVEL_LINKFLAGS"])
     elif env["arch"] == "x86_32":
         env.Append(CCFLAGS=["-m32", "-march=i686"])
         env.Append(LINKFLAGS=["-m32", "-march=i686"])
     elif env["arch"] == "arm64":
-        env.Append(CCFLAGS=["-march=armv8-a"])
-        env.Append(LINKFLAGS=["-march=armv8-a"])
+        setup_cpu_level(env, "armv8-a")
+        env.Append(CCFLAGS=["$CPU_LEVEL_FLAGS"])
+        env.Append(LINKFLAGS=["$CPU_LEVEL_LINKFLAGS"])
     elif env["arch"] == "rv64":
         env.Append(CCFLAGS=["-march=rv64gc"])
         env.Append(LINKFLAGS=["-march=rv64gc"])
 
+    if env["arch"] not in ("x86_64", "arm64"):
+        # Validates that no cpu_level was requested.
+        setup_cpu_level(env)
+
     # Link statically for portability
     if env["use_static_cpp"]:
         env.Append(LINKFLAGS=["-static-libgcc", "-static-libstdc++"])
@@ -88,7 +110,12 @@ def generate(env):
 
     env.Append(CPPDEFINES=["LINUX_ENABLED", "UNIX_ENABLED"])
 
+    # Huge link and archive lines go over the 128 KiB `sh -c` argument limit.
+    setup_response_files(env)
+
     if env["lto"] == "auto":
         env["lto"] = "full"
 
+    select_linker(env)
+
     common_compiler_flags.generate(env)
@@ -3,7 +3,8 @@ import os
 import sys
 
 from build import common_compiler_flags
-from SCons.Variables import BoolVariable
+from build.cpu_level import setup_cpu_level
+from build.platform_options import macos_options
 
 
 def has_osxcross():
@@ -11,13 +12,7 @@ def has_osxcross():
 
 
 def options(opts):
-    opts.Add("macos_deployment_target", "macOS deployment target", "default")
-    opts.Add("macos_sdk_path", "macOS SDK path", "")
-    if has_osxcross():
-        opts.Add("osxcross_sdk", "OSXCross SDK version", "darwin16")
-    opts.Add(BoolVariable("use_ubsan", "Use LLVM/GCC compiler undefined behavior sanitizer (UBSAN)", False))
-    opts.Add(BoolVariable("use_asan", "Use LLVM/GCC compiler address sanitizer (ASAN)", False))
-    opts.Add(BoolVariable("use_tsan", "Use LLVM/GCC compiler thread sanitizer (TSAN)", False))
+    macos_options(opts)
 
 
 def exists(env):
@@ -60,6 +55,13 @@ def generate(env):
         env.Append(LINKFLAGS=["-arch", env["arch"]])
         env.Append(CCFLAGS=["-arch", env["arch"]])
 
+    if env["arch"] == "universal" and env["cpu_level"]:
+        print("cpu_level can't be used with universal builds, pick arm64 or x86_64.")
+        env.Exit(255)
+    setup_cpu_level(env)
+    env.Append(CCFLAGS=["$CPU_LEVEL_FLAGS"])
+    env.Append(LINKFLAGS=["$CPU_LEVEL_LINKFLAGS"])
+
     if env["macos_deployment_target"] != "default":
         env.Append(CCFLAGS=["-mmacosx-version-min=" + env["macos_deployment_target"]])
         env.Append(LINKFLAGS=["-mmacosx-version-min=" + env["macos_deployment_target"]])
@@ -1,6 +1,4 @@
 # Copied from https://github.com/godotengine/godot-cpp/blob/df5b1a9a692b0d972f5ac3c853371594cdec420b/tools/targets.py
-import os
-import subprocess
 import sys
 from SCons.Script import ARGUMENTS
 from SCons.Variables import EnumVariable, BoolVariable
@@ -10,32 +8,17 @@ from SCons.Variables.BoolVariable import _text2bool
 # Helper methods
 
 
-def get_cmdline_bool(option, default):
+def get_cmdline_bool(option, default, arguments=ARGUMENTS):
     """We use `ARGUMENTS.get()` to check if options were manually overridden on the command line,
     and SCons' _text2bool helper to convert them to booleans, otherwise they're handled as strings.
     """
-    cmdline_val = ARGUMENTS.get(option)
+    cmdline_val = arguments.get(option)
     if cmdline_val is not None:
         return _text2bool(cmdline_val)
     else:
         return default
 
 
-def using_clang(env):
-    return "clang" in os.path.basename(env["CC"])
-
-
-def is_vanilla_clang(env):
-    if not using_clang(env):
-        return False
-    try:
-        version = subprocess.check_output([env.subst(env["CXX"]), "--version"]).strip().decode("utf-8")
-    except (subprocess.CalledProcessError, OSError):
-        print("Couldn't parse CXX environment variable to infer compiler version.")
-        return False
-    return not version.startswith("Apple")
-
-
 # Main tool definition
 
 
@@ -57,7 +40,31 @@ def options(opts):
             ("none", "auto", "thin", "full"),
         )
     )
+    opts.Add("lto_jobs", "Parallel jobs of LTO links, 'auto' uses the job count of the build", "auto")
+    opts.Add("lto_cache", "Persistent ThinLTO cache directory, relative to the project root, empty to disable it", "")
+    opts.Add(
+        "lto_cache_size",
+        "Size the ThinLTO cache is pruned to by the linker, in megabytes or as a percentage of the free disk space",
+        "2048",
+    )
+    opts.Add(
+        EnumVariable(
+            "pgo",
+            "Profile-guided optimization, 'generate' builds an instrumented binary, 'use' optimizes with its profiles",
+            "none",
+            ("none", "generate", "use"),
+        )
+    )
+    opts.Add("pgo_dir", "Directory PGO profiles are written to and read from, relative to the project root", "pgo")
     opts.Add(BoolVariable("debug_symbols", "Build with debugging symbols", True))
+    opts.Add(BoolVariable("split_debug", "Write debugging symbols to .dwo files next to the objects (-gsplit-dwarf)", False))
+    opts.Add(BoolVariable("compress_debug", "Compress debugging symbols in objects and binaries (-gz)", False))
+    opts.Add(
+        "cpu_level",
+        "CPU microarchitecture level (x86-64-v1 to x86-64-v4, armv8-a to armv9-a), "
+        "a comma-separated list builds one variant per level with `env.CpuLevelVariants()`",
+        "",
+    )
     opts.Add(BoolVariable("dev_build", "Developer build with dev-only debugging code (DEV_ENABLED)", False))
     opts.Add(EnumVariable(
             "harden_memory",
@@ -83,6 +90,9 @@ def generate(env):
 
     # Keep this configuration in sync with SConstruct in upstream Godot.
 
+    # The command line, with the overrides of the variant being configured.
+    arguments = getattr(env, "variant_arguments", ARGUMENTS)
+
     env.use_hot_reload = env.get("use_hot_reload", env["target"] != "template_release")
     env.editor_build = env["target"] == "editor"
     env.dev_build = env["dev_build"]
@@ -95,16 +105,16 @@ def generate(env):
             opt_level = "speed_trace"
         else:  # Release
             opt_level = "speed"
-        env["optimize"] = ARGUMENTS.get("optimize", opt_level)
+        env["optimize"] = arguments.get("optimize", opt_level)
 
     if env["harden_memory"] == "auto":
         if env.dev_build:
             harden_level = "none"
         else:
             harden_level = "fast"
-        env["harden_memory"] = ARGUMENTS.get("harden_memory", harden_level)
+        env["harden_memory"] = arguments.get("harden_memory", harden_level)
 
-    env["debug_symbols"] = get_cmdline_bool("debug_symbols", env.dev_build)
+    env["debug_symbols"] = get_cmdline_bool("debug_symbols", env.dev_build, arguments)
 
     if env.use_hot_reload:
         env.Append(CPPDEFINES=["HOT_RELOAD_ENABLED"])
@@ -1,11 +1,12 @@
 # Based on https://github.com/godotengine/godot-cpp/blob/98ea2f60bb3846d6ae410d8936137d1b099cd50b/tools/windows.py
-import os
 import sys
 
 from build import common_compiler_flags
-import my_spawn
+from build.cpu_level import setup_cpu_level
+from build.platform_options import windows_options
+from build.response_file import setup_response_files
+from build.toolchain import tool_exists
 from SCons.Tool import mingw, msvc
-from SCons.Variables import BoolVariable
 
 
 def silence_msvc(env):
@@ -74,15 +75,7 @@ def silence_msvc(env):
 
 
 def options(opts):
-    mingw = os.getenv("MINGW_PREFIX", "")
-
-    opts.Add(BoolVariable("use_mingw", "Use the MinGW compiler instead of MSVC - only effective on Windows", False))
-    opts.Add(BoolVariable("use_static_cpp", "Link MinGW/MSVC C++ runtime libraries statically", False))
-    opts.Add(BoolVariable("silence_msvc", "Silence MSVC's cl/link stdout bloat, redirecting errors to stderr.", True))
-    opts.Add(BoolVariable("debug_crt", "Compile with MSVC's debug CRT (/MDd)", False))
-    opts.Add(BoolVariable("use_llvm", "Use the LLVM compiler (MVSC or MinGW depending on the use_mingw flag)", False))
-    opts.Add("mingw_prefix", "MinGW prefix", mingw)
-    opts.Add(BoolVariable("use_asan", "Use address sanitizer (ASAN)", False))
+    windows_options(opts)
 
 
 def exists(env):
@@ -92,8 +85,9 @@ def exists(env):
 def generate(env):
     base = None
 
-    msvc_found = msvc.exists(env)
-    mingw_found = mingw.exists(env)
+    # Detecting MSVC queries the registry and vswhere, only do it again when the environment changes.
+    msvc_found = tool_exists(env, "msvc", msvc.exists, ("PATH", "VCINSTALLDIR", "VSINSTALLDIR", "ProgramFiles(x86)"))
+    mingw_found = tool_exists(env, "mingw", mingw.exists, ("PATH", "MINGW_PREFIX"))
 
     if not msvc_found and not mingw_found:
         print("Could not find installation of msvc or mingw, please properly install (or reinstall) MSVC with C++ or Mingw first.")
@@ -161,8 +155,10 @@ def generate(env):
                 ]
             )
 
-        # Long line hack. Use custom spawn, quick AR append (to avoid files with the same names to override each other).
-        my_spawn.configure(env)
+        # Long command lines go through response files, quick AR append (to avoid files with the same names to
+        # override each other).
+        setup_response_files(env)
+        env.Replace(ARFLAGS=["q"])
 
     else:
         env["use_mingw"] = True
@@ -209,8 +205,11 @@ def generate(env):
         if env["use_llvm"]:
             env.Append(LINKFLAGS=["-lstdc++"])
 
+        # Huge link lines hit the command line limits of every host.
+        setup_response_files(env)
         if sys.platform == "win32" or sys.platform == "msys":
-            my_spawn.configure(env)
+            # Quick AR append, like MSVC builds (to avoid files with the same names to override each other).
+            env.Replace(ARFLAGS=["q"])
 
     if env["use_mingw"] and not mingw_found:
         print("'use_mingw' set but Mingw is not installed, please install Mingw first.")
@@ -221,6 +220,10 @@ def generate(env):
         env.Append(LINKFLAGS=["/INFERASANLIBS"])
         env.Append(CCFLAGS=["/fsanitize=address"])
 
+    setup_cpu_level(env)
+    env.Append(CCFLAGS=["$CPU_LEVEL_FLAGS"])
+    env.Append(LINKFLAGS=["$CPU_LEVEL_LINKFLAGS"])
+
     env.Append(CPPDEFINES=["WINDOWS_ENABLED"])
 
     if env["lto"] == "auto":